@@ -1,8 +1,17 @@
 # 字典和列表操作学习素材和练习
 
+import os
 import json
 import copy
-from collections import defaultdict, Counter, OrderedDict
+import time
+import heapq
+import bisect
+import random
+import tempfile
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from array import array
+from collections import Counter, OrderedDict, deque
 from operator import itemgetter
 
 # ==================== 列表操作 ====================
@@ -437,29 +446,19 @@ def practical_exercises():
     # 练习1：学生成绩管理系统
     def grade_management_system():
         """成绩管理系统"""
-        students = {}
+        store = GradeStore()  # 列式存储，见 GradeStore
         
         def add_student(name, subjects_grades):
-            students[name] = subjects_grades
+            store.add_student(name, subjects_grades)
         
         def get_student_average(name):
-            if name in students:
-                grades = list(students[name].values())
-                return sum(grades) / len(grades) if grades else 0
-            return None
+            return store.get_student_average(name)
         
         def get_subject_average(subject):
-            total = 0
-            count = 0
-            for student_grades in students.values():
-                if subject in student_grades:
-                    total += student_grades[subject]
-                    count += 1
-            return total / count if count > 0 else None
+            return store.get_subject_average(subject)
         
         def get_top_students(n=3):
-            averages = [(name, get_student_average(name)) for name in students]
-            return sorted(averages, key=lambda x: x[1], reverse=True)[:n]
+            return store.get_top_students(n)
         
         # 测试数据
         add_student("Alice", {"Math": 90, "Physics": 85, "Chemistry": 88})
@@ -486,36 +485,627 @@ def practical_exercises():
             "2024-01-01 10:05:10 INFO User logout: alice"
         ]
         
-        # 分析日志
-        log_levels = Counter()
-        error_messages = []
-        user_activities = defaultdict(list)
-        
-        for log in logs:
-            parts = log.split(" ", 3)
-            if len(parts) >= 4:
-                date, time, level, message = parts
-                
-                log_levels[level] += 1
-                
-                if level == "ERROR":
-                    error_messages.append(message)
-                
-                if "User" in message:
-                    if "login:" in message:
-                        user = message.split("login: ")[1]
-                        user_activities[user].append(f"{time} login")
-                    elif "logout:" in message:
-                        user = message.split("logout: ")[1]
-                        user_activities[user].append(f"{time} logout")
+        # 分析日志（与处理大文件使用同一个流式分析器，见 LogAggregate）
+        aggregate = LogAggregate()
+        aggregate.update(line.encode("utf-8") for line in logs)
         
         print("\n=== 日志分析结果 ===")
-        print(f"日志级别统计: {dict(log_levels)}")
-        print(f"错误消息: {error_messages}")
-        print(f"用户活动: {dict(user_activities)}")
+        print(f"日志级别统计: {dict(aggregate.level_counts)}")
+        print(f"错误消息: {aggregate.top_errors()}")
+        print(f"用户活动: {aggregate.user_activity_dict()}")
     
     log_analysis()
 
+# ==================== 日志流式分析 ====================
+
+class TopK:
+    """有界内存的高频项统计（Space-Saving 算法）
+
+    最多跟踪 capacity 个项；满了以后新项替换计数最小的项并继承其计数，
+    因此计数是上界估计，但真正的高频项一定会被保留下来。
+    计数最小的项用带惰性失效的小顶堆查找：已跟踪项的计数增加时不更新堆，
+    淘汰时发现堆顶记录的计数过期才把它按当前计数放回，每次淘汰均摊 O(log capacity)。
+    """
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.counts = {}
+        self._heap = []  # 每个已跟踪项恰好一条 (入堆时的计数, 序号, 项)，序号避免比较项本身
+        self._seq = 0
+
+    def add(self, item, count=1):
+        counts = self.counts
+        if item in counts:
+            counts[item] += count
+            return
+        heap = self._heap
+        if len(counts) < self.capacity:
+            counts[item] = count
+            self._seq += 1
+            heapq.heappush(heap, (count, self._seq, item))
+            return
+        while True:
+            stale, _, victim = heap[0]
+            current = counts[victim]
+            if stale == current:
+                break
+            self._seq += 1
+            heapq.heapreplace(heap, (current, self._seq, victim))
+        del counts[victim]
+        counts[item] = current + count
+        self._seq += 1
+        heapq.heapreplace(heap, (current + count, self._seq, item))
+
+    def most_common(self, n=None):
+        return sorted(self.counts.items(), key=itemgetter(1), reverse=True)[:n]
+
+    def merge(self, other):
+        for item, count in other.counts.items():
+            self.add(item, count)
+        return self
+
+class LogAggregate:
+    """日志聚合结果：级别计数、错误消息 Top-K、用户活动
+
+    内存占用有上限：错误消息最多跟踪 top_k_capacity 条，用户最多保留 max_users 个
+    （淘汰最久没有活动的用户），每个用户只保留最近 recent_per_user 条活动。
+    """
+    def __init__(self, top_k_capacity=100, max_users=10000, recent_per_user=20):
+        self.level_counts = Counter()
+        self.errors = TopK(top_k_capacity)
+        self.max_users = max_users
+        self.recent_per_user = recent_per_user
+        self.user_activities = OrderedDict()  # 用户 -> deque["时间 动作"]
+        self.lines = 0
+
+    def _record_user(self, user, entry):
+        activities = self.user_activities.get(user)
+        if activities is None:
+            activities = self.user_activities[user] = deque(maxlen=self.recent_per_user)
+            if len(self.user_activities) > self.max_users:
+                self.user_activities.popitem(last=False)
+        else:
+            self.user_activities.move_to_end(user)
+        activities.append(entry)
+
+    def update(self, lines):
+        """消费一个产出 bytes 行的可迭代对象（可以是生成器），逐行更新聚合结果"""
+        levels = {}  # 热循环里按 bytes 计数，结束后再解码合并到 level_counts
+        add_error = self.errors.add
+        count = 0
+        for line in lines:
+            count += 1
+            parts = line.rstrip(b"\r").split(b" ", 3)
+            if len(parts) < 4:
+                continue
+            _, time_part, level, message = parts
+            levels[level] = levels.get(level, 0) + 1
+            if level == b"ERROR":
+                add_error(message.decode("utf-8", "replace"))
+            if b"User" in message:
+                if b"login: " in message:
+                    user, action = message.split(b"login: ", 1)[1], "login"
+                elif b"logout: " in message:
+                    user, action = message.split(b"logout: ", 1)[1], "logout"
+                else:
+                    continue
+                self._record_user(user.decode("utf-8", "replace"), f"{time_part.decode('ascii', 'replace')} {action}")
+        for level, n in levels.items():
+            self.level_counts[level.decode("ascii", "replace")] += n
+        self.lines += count
+        return self
+
+    def merge(self, other):
+        """合并另一段日志的聚合结果；other 必须对应更靠后的日志，才能保证“最近活动”的顺序正确"""
+        self.level_counts.update(other.level_counts)
+        self.errors.merge(other.errors)
+        for user, activities in other.user_activities.items():
+            for entry in activities:
+                self._record_user(user, entry)
+        self.lines += other.lines
+        return self
+
+    def to_dict(self):
+        """转换为可以 JSON 序列化的字典，用于持久化检查点"""
+        return {
+            "options": {"top_k_capacity": self.errors.capacity, "max_users": self.max_users,
+                        "recent_per_user": self.recent_per_user},
+            "lines": self.lines,
+            "level_counts": dict(self.level_counts),
+            "errors": list(self.errors.counts.items()),
+            "user_activities": [[user, list(activities)] for user, activities in self.user_activities.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        aggregate = cls(**data["options"])
+        aggregate.lines = data["lines"]
+        aggregate.level_counts.update(data["level_counts"])
+        for message, count in data["errors"]:
+            aggregate.errors.add(message, count)
+        for user, entries in data["user_activities"]:
+            aggregate.user_activities[user] = deque(entries, maxlen=aggregate.recent_per_user)
+        return aggregate
+
+    def top_errors(self, n=10):
+        return self.errors.most_common(n)
+
+    def user_activity_dict(self):
+        return {user: list(activities) for user, activities in self.user_activities.items()}
+
+def iter_log_lines(path, chunk_size=1 << 20, start=0, end=None):
+    """以大块二进制方式读取日志文件，按行产出 bytes（不含换行符）
+
+    只在内存中保留一个块和跨块的半行，内存占用与文件大小无关。
+    """
+    with open(path, "rb", buffering=0) as f:
+        f.seek(start)
+        remaining = None if end is None else end - start
+        carry = b""
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            chunk = f.read(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            lines = (carry + chunk).split(b"\n")
+            carry = lines.pop()
+            yield from lines
+        if carry:
+            yield carry
+
+def analyze_log_file(path, chunk_size=1 << 20, **aggregate_options):
+    """流式分析日志文件，返回 LogAggregate"""
+    return LogAggregate(**aggregate_options).update(iter_log_lines(path, chunk_size))
+
+def split_log_file(path, parts):
+    """把文件切成 parts 个字节区间 [start, end)，每个切分点都对齐到下一行的开头"""
+    size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, "rb") as f:
+        for i in range(1, parts):
+            f.seek(max(size * i // parts, boundaries[-1]))
+            f.readline()  # 跳到下一行开头
+            boundaries.append(min(f.tell(), size))
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+def _analyze_log_range(path, start, end, chunk_size, aggregate_options):
+    """子进程中执行：分析一个字节区间，返回部分聚合结果"""
+    return LogAggregate(**aggregate_options).update(iter_log_lines(path, chunk_size, start, end))
+
+def analyze_log_file_parallel(path, workers=None, chunk_size=1 << 20, **aggregate_options):
+    """多进程分析日志文件：按行边界切分字节区间，各进程分别聚合，最后按文件顺序合并"""
+    workers = workers or os.cpu_count() or 1
+    ranges = split_log_file(path, workers)
+    if workers == 1 or len(ranges) <= 1:
+        return analyze_log_file(path, chunk_size, **aggregate_options)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_analyze_log_range, path, start, end, chunk_size, aggregate_options)
+                   for start, end in ranges]
+        result = LogAggregate(**aggregate_options)
+        for future in futures:  # 按区间顺序合并
+            result.merge(future.result())
+    return result
+
+def benchmark_parallel_log_analysis(line_count=1000000, max_workers=None):
+    """按 1, 2, 4 ... 个进程测量并行分析的耗时和加速比"""
+    max_workers = max_workers or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "app.log")
+        generate_sample_log(path, line_count)
+        size = os.path.getsize(path)
+        counts, baseline = [], None
+        workers = 1
+        while workers < max_workers:
+            counts.append(workers)
+            workers *= 2
+        counts.append(max_workers)
+        for workers in counts:
+            start = time.perf_counter()
+            aggregate = analyze_log_file_parallel(path, workers)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"{workers}个进程: {elapsed:.2f}秒, {size / 1e6 / elapsed:.1f} MB/s, "
+                  f"加速比 {baseline / elapsed:.2f}x, 共{aggregate.lines:,}行")
+
+class LogFollower:
+    """增量跟踪日志文件：每次运行只分析上次检查点之后新写入的完整行
+
+    检查点（JSON）保存文件的设备号+inode、已处理的字节偏移和聚合结果。
+    文件被轮转（inode 变化）时，先在 rotated_suffixes 对应的旧文件中找到原 inode，
+    把剩余部分处理完，再从新文件开头开始；文件被截断时从头开始。
+    """
+    def __init__(self, path, state_path, rotated_suffixes=(".1",), chunk_size=1 << 20, **aggregate_options):
+        self.path = path
+        self.state_path = state_path
+        self.rotated_suffixes = rotated_suffixes
+        self.chunk_size = chunk_size
+        self.identity = None
+        self.offset = 0
+        self.aggregate = LogAggregate(**aggregate_options)
+        if os.path.exists(state_path):
+            with open(state_path, encoding="utf-8") as f:
+                state = json.load(f)
+            self.identity = tuple(state["identity"]) if state["identity"] else None
+            self.offset = state["offset"]
+            self.aggregate = LogAggregate.from_dict(state["aggregate"])
+
+    def _save(self):
+        state = {"identity": self.identity, "offset": self.offset, "aggregate": self.aggregate.to_dict()}
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)  # 原子替换，中途崩溃不会留下半个检查点
+
+    @staticmethod
+    def _complete_lines_end(path, start, end):
+        """返回 [start, end) 中最后一个换行符之后的位置，末尾未写完的行留到下次处理"""
+        with open(path, "rb") as f:
+            position = end
+            while position > start:
+                window = min(64 * 1024, position - start)
+                f.seek(position - window)
+                newline = f.read(window).rfind(b"\n")
+                if newline >= 0:
+                    return position - window + newline + 1
+                position -= window
+        return start
+
+    def _consume(self, path, start, size, final=False):
+        # 已轮转的旧文件不会再被写入，末尾没有换行的行也一并处理
+        end = size if final else self._complete_lines_end(path, start, size)
+        if end > start:
+            self.aggregate.update(iter_log_lines(path, self.chunk_size, start, end))
+        return end
+
+    def _find_rotated(self):
+        for suffix in self.rotated_suffixes:
+            candidate = self.path + suffix
+            try:
+                st = os.stat(candidate)
+            except FileNotFoundError:
+                continue
+            if (st.st_dev, st.st_ino) == self.identity:
+                return candidate, st.st_size
+        return None
+
+    def run_once(self):
+        """处理新增内容并保存检查点，返回本次处理的字节数"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        identity = (st.st_dev, st.st_ino)
+        processed = 0
+        if self.identity is not None and identity != self.identity:
+            rotated = self._find_rotated()
+            if rotated is not None:
+                rotated_path, rotated_size = rotated
+                processed += self._consume(rotated_path, self.offset, rotated_size, final=True) - self.offset
+            self.offset = 0
+        elif st.st_size < self.offset:
+            self.offset = 0  # 文件被截断（如 copytruncate）
+        self.identity = identity
+
+        end = self._consume(self.path, self.offset, st.st_size)
+        processed += end - self.offset
+        self.offset = end
+        self._save()
+        return processed
+
+def generate_sample_log(path, line_count, seed=0):
+    """生成与 log_analysis 示例格式相同的测试日志文件"""
+    rng = random.Random(seed)
+    users = [f"user{i}" for i in range(1000)]
+    templates = [
+        ("INFO", lambda: f"User login: {rng.choice(users)}"),
+        ("INFO", lambda: f"User logout: {rng.choice(users)}"),
+        ("INFO", lambda: "Request handled"),
+        ("WARNING", lambda: "Slow query detected"),
+        ("ERROR", lambda: f"Database connection failed on shard {rng.randrange(20)}"),
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        batch = []
+        for i in range(line_count):
+            level, message = rng.choice(templates)
+            batch.append(f"2024-01-01 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d} {level} {message()}\n")
+            if len(batch) >= 10000:
+                f.writelines(batch)
+                batch.clear()
+        f.writelines(batch)
+
+def benchmark_log_analysis(line_count=1000000):
+    """测量流式分析器的吞吐量（MB/s）"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "app.log")
+        generate_sample_log(path, line_count)
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        aggregate = analyze_log_file(path)
+        elapsed = time.perf_counter() - start
+        print(f"{aggregate.lines:,}行 / {size / 1e6:.1f}MB: {elapsed:.2f}秒, {size / 1e6 / elapsed:.1f} MB/s")
+        print(f"级别统计: {dict(aggregate.level_counts)}, 错误Top3: {aggregate.top_errors(3)}")
+        return aggregate
+
+def log_follow_example():
+    """模拟定时任务：追加日志、轮转日志，每次只处理新增部分"""
+    print("\n=== 增量跟踪日志 ===")
+    with tempfile.TemporaryDirectory() as directory:
+        log_path = os.path.join(directory, "app.log")
+        state_path = os.path.join(directory, "app.log.state")
+        with open(log_path, "w", encoding="utf-8") as f:
+            f.write("2024-01-01 10:00:01 INFO User login: alice\n2024-01-01 10:01:15 ERROR Disk full\n")
+        print(f"第1次运行: 处理 {LogFollower(log_path, state_path).run_once()} 字节")
+
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write("2024-01-01 10:02:30 INFO User login: bob\n2024-01-01 10:03")  # 最后一行还没写完
+        print(f"第2次运行: 处理 {LogFollower(log_path, state_path).run_once()} 字节")
+
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(":45 ERROR Disk full\n")
+        os.replace(log_path, log_path + ".1")  # 日志轮转
+        with open(log_path, "w", encoding="utf-8") as f:
+            f.write("2024-01-01 10:05:10 INFO User logout: alice\n")
+        follower = LogFollower(log_path, state_path)
+        print(f"第3次运行（轮转后）: 处理 {follower.run_once()} 字节")
+        print(f"级别统计: {dict(follower.aggregate.level_counts)}, 错误: {follower.aggregate.top_errors()}")
+        print(f"用户活动: {follower.aggregate.user_activity_dict()}")
+
+# ==================== 列式成绩存储 ====================
+
+class GradeStore:
+    """学生 × 科目的列式成绩表
+
+    每个科目一列 array('d') 成绩加一列 bytearray 标记（1 表示有成绩，缺失位置成绩记为0），
+    这样整列求和、计数都由 sum()/bytearray.count() 在C层完成。
+    同时维护每个学生的成绩总和与科目数，学生平均分不必逐个字典遍历。
+    各科平均分和全体学生平均分按需计算并缓存，add_student 时失效。
+    """
+    def __init__(self):
+        self.students = []           # 行号 -> 姓名
+        self._row_of = {}            # 姓名 -> 行号
+        self.subjects = []
+        self._values = {}            # 科目 -> array('d')
+        self._present = {}           # 科目 -> bytearray
+        self._row_sums = array("d")
+        self._row_counts = array("H")
+        self._subject_cache = {}
+        self._averages_cache = None
+        self.leaderboard = Leaderboard()
+
+    def __len__(self):
+        return len(self.students)
+
+    def _add_subject(self, subject):
+        rows = len(self.students)
+        self.subjects.append(subject)
+        self._values[subject] = array("d", bytes(8 * rows))
+        self._present[subject] = bytearray(rows)
+
+    def add_student(self, name, subjects_grades):
+        """添加学生；同名学生已存在时用新成绩整体替换旧成绩"""
+        row = self._row_of.get(name)
+        if row is None:
+            row = len(self.students)
+            self._row_of[name] = row
+            self.students.append(name)
+            for subject in self.subjects:
+                self._values[subject].append(0.0)
+                self._present[subject].append(0)
+            self._row_sums.append(0.0)
+            self._row_counts.append(0)
+        else:
+            for subject in self.subjects:
+                self._values[subject][row] = 0.0
+                self._present[subject][row] = 0
+
+        total = 0.0
+        for subject, grade in subjects_grades.items():
+            if subject not in self._values:
+                self._add_subject(subject)
+            self._values[subject][row] = grade
+            self._present[subject][row] = 1
+            total += grade
+        self._row_sums[row] = total
+        self._row_counts[row] = len(subjects_grades)
+        self.leaderboard.set_totals(name, total, len(subjects_grades))
+        self._subject_cache.clear()
+        self._averages_cache = None
+
+    def get_student_average(self, name):
+        row = self._row_of.get(name)
+        if row is None:
+            return None
+        count = self._row_counts[row]
+        return self._row_sums[row] / count if count else 0
+
+    def get_subject_average(self, subject):
+        if subject not in self._subject_cache:
+            values = self._values.get(subject)
+            count = self._present[subject].count(1) if values is not None else 0
+            self._subject_cache[subject] = sum(values) / count if count else None
+        return self._subject_cache[subject]
+
+    def student_averages(self):
+        """全体学生的平均分列表（与 students 顺序一致），结果会被缓存"""
+        if self._averages_cache is None:
+            self._averages_cache = [total / count if count else 0
+                                    for total, count in zip(self._row_sums, self._row_counts)]
+        return self._averages_cache
+
+    def get_top_students(self, n=3):
+        """前 n 名直接从增量维护的排行榜读取，写入后不需要重新计算全部平均分"""
+        return self.leaderboard.top(n)
+
+    def get_top_students_heap(self, n=3):
+        """不依赖排行榜：用 heapq.nlargest 取前 n 名，O(N log n) 而不是对全部学生排序"""
+        averages = self.student_averages()
+        top = heapq.nlargest(n, range(len(averages)), key=averages.__getitem__)
+        return [(self.students[row], averages[row]) for row in top]
+
+def benchmark_grade_store(student_count=200000, subjects=("Math", "Physics", "Chemistry", "Biology", "History")):
+    """对比字典实现与 GradeStore 的各科平均分和前N名查询"""
+    rng = random.Random(11)
+    records = [(f"student{i}", {s: rng.randint(40, 100) for s in subjects if rng.random() < 0.9})
+               for i in range(student_count)]
+    students = dict(records)
+    store = GradeStore()
+    for name, grades in records:
+        store.add_student(name, grades)
+
+    def dict_subject_average(subject):
+        grades = [g[subject] for g in students.values() if subject in g]
+        return sum(grades) / len(grades) if grades else None
+
+    def dict_top(n):
+        averages = [(name, sum(g.values()) / len(g) if g else 0) for name, g in students.items()]
+        return sorted(averages, key=lambda x: x[1], reverse=True)[:n]
+
+    cases = [
+        ("字典: 各科平均分", lambda: [dict_subject_average(s) for s in subjects]),
+        ("GradeStore: 各科平均分(首次)", lambda: [store.get_subject_average(s) for s in subjects]),
+        ("GradeStore: 各科平均分(缓存)", lambda: [store.get_subject_average(s) for s in subjects]),
+        ("字典: 前10名", lambda: dict_top(10)),
+        ("GradeStore: 前10名(堆，首次)", lambda: store.get_top_students_heap(10)),
+        ("GradeStore: 前10名(堆，缓存平均分)", lambda: store.get_top_students_heap(10)),
+        ("GradeStore: 前10名(排行榜)", lambda: store.get_top_students(10)),
+    ]
+    for label, run in cases:
+        start = time.perf_counter()
+        run()
+        print(f"{label}: {(time.perf_counter() - start) * 1000:.2f}ms")
+
+# ==================== 增量维护的排行榜 ====================
+
+class SortedKeyList:
+    """分桶的有序列表：元素分散在若干个长度不超过 2*load 的有序小列表中
+
+    插入/删除先用 bisect 在各桶的最大值中定位桶（O(log n)），再在桶内 insort/删除（O(load)），
+    避免单个大列表每次插入都要移动大量元素。
+    """
+    def __init__(self, load=512):
+        self.load = load
+        self._buckets = []
+        self._maxes = []
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def _locate(self, key):
+        index = bisect.bisect_left(self._maxes, key)
+        return min(index, len(self._buckets) - 1)
+
+    def add(self, key):
+        self._len += 1
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            return
+        index = self._locate(key)
+        bucket = self._buckets[index]
+        bisect.insort(bucket, key)
+        self._maxes[index] = bucket[-1]
+        if len(bucket) > 2 * self.load:
+            half = bucket[self.load:]
+            del bucket[self.load:]
+            self._maxes[index] = bucket[-1]
+            self._buckets.insert(index + 1, half)
+            self._maxes.insert(index + 1, half[-1])
+
+    def remove(self, key):
+        index = self._locate(key)
+        bucket = self._buckets[index] if self._buckets else []
+        position = bisect.bisect_left(bucket, key)
+        if position == len(bucket) or bucket[position] != key:
+            raise ValueError(f"{key!r} 不在列表中")
+        del bucket[position]
+        self._len -= 1
+        if bucket:
+            self._maxes[index] = bucket[-1]
+        else:
+            del self._buckets[index]
+            del self._maxes[index]
+
+    def __iter__(self):
+        for bucket in self._buckets:
+            yield from bucket
+
+class Leaderboard:
+    """按平均分排序的排行榜：保存每个学生的成绩总和与科目数，更新时只调整该学生的位置
+
+    排序键为 (-平均分, 姓名)，所以从头遍历就是从高到低；更新 O(log n)，取前 n 名 O(n)。
+    """
+    def __init__(self):
+        self._totals = {}
+        self._counts = {}
+        self._keys = {}
+        self._order = SortedKeyList()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _reposition(self, name):
+        old_key = self._keys.get(name)
+        if old_key is not None:
+            self._order.remove(old_key)
+        count = self._counts[name]
+        key = (-(self._totals[name] / count) if count else 0, name)
+        self._keys[name] = key
+        self._order.add(key)
+
+    def set_totals(self, name, total, count):
+        """直接设置某个学生的成绩总和与科目数（用于整体替换成绩）"""
+        self._totals[name] = total
+        self._counts[name] = count
+        self._reposition(name)
+
+    def record_grade(self, name, grade):
+        """给学生追加一门成绩"""
+        self._totals[name] = self._totals.get(name, 0) + grade
+        self._counts[name] = self._counts.get(name, 0) + 1
+        self._reposition(name)
+
+    def remove(self, name):
+        self._order.remove(self._keys.pop(name))
+        del self._totals[name], self._counts[name]
+
+    def average(self, name):
+        key = self._keys.get(name)
+        return None if key is None else -key[0]
+
+    def top(self, n=3):
+        return [(name, -negative_average) for negative_average, name in itertools.islice(self._order, n)]
+
+def benchmark_leaderboard(student_count=100000, operations=20000, naive_operations=200):
+    """写读交替：每次给随机学生追加一门成绩后查询前10名"""
+    rng = random.Random(13)
+    names = [f"student{i}" for i in range(student_count)]
+    totals = [0] * student_count
+    counts = [0] * student_count
+    board = Leaderboard()
+    for i, name in enumerate(names):
+        grade = rng.randint(40, 100)
+        totals[i], counts[i] = grade, 1
+        board.record_grade(name, grade)
+
+    start = time.perf_counter()
+    for _ in range(naive_operations):
+        i = rng.randrange(student_count)
+        totals[i] += rng.randint(40, 100)
+        counts[i] += 1
+        averages = [t / c for t, c in zip(totals, counts)]
+        heapq.nlargest(10, range(student_count), key=averages.__getitem__)
+    naive = (time.perf_counter() - start) / naive_operations
+
+    start = time.perf_counter()
+    for _ in range(operations):
+        board.record_grade(names[rng.randrange(student_count)], rng.randint(40, 100))
+        board.top(10)
+    incremental = (time.perf_counter() - start) / operations
+    print(f"{student_count:,}名学生: 每次重新计算 {naive * 1e6:,.0f}µs/次, 排行榜 {incremental * 1e6:,.1f}µs/次")
+
 # 主函数
 def main():
     """主函数"""
@@ -539,6 +1129,15 @@ def main():
     
     # 实战练习
     practical_exercises()
+    
+    # 日志流式分析
+    benchmark_log_analysis(200000)
+    benchmark_parallel_log_analysis(400000)
+    log_follow_example()
+    
+    # 列式成绩存储
+    benchmark_grade_store()
+    benchmark_leaderboard()
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,18 @@
 # 装饰器学习素材和练习
 
+import sys
+import json
 import time
+import queue
+import atexit
+import random
+import asyncio
+import inspect
 import functools
+import itertools
+import threading
+from collections import Counter, OrderedDict, deque, namedtuple
+from contextlib import nullcontext
 from datetime import datetime
 
 # 1. 简单装饰器基础
@@ -19,26 +30,185 @@ def say_hello():
     print("Hello, World!")
 
 # 2. 带参数的装饰器
-def timer(func):
-    """计时装饰器"""
-    @functools.wraps(func)  # 保留原函数的元信息
-    def wrapper(*args, **kwargs):
-        start_time = time.time()
-        result = func(*args, **kwargs)
-        end_time = time.time()
-        print(f"{func.__name__} 执行耗时: {end_time - start_time:.4f}秒")
+class LatencyHistogram:
+    """HDR风格的对数-线性延迟直方图（单位：纳秒）
+
+    每个2的幂区间再细分为16个桶，相对误差约6%，内存固定，记录一次只需几次整数运算。
+    多线程并发记录时计数可能有极少量丢失，适合监控而非精确计费。
+    """
+    SUB_BUCKETS = 16
+    _LINEAR_LIMIT = 2 * SUB_BUCKETS  # 小于32ns的值每个值一个桶
+
+    def __init__(self):
+        self.counts = [0] * 1024  # 覆盖到 2**63 ns
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @classmethod
+    def bucket_index(cls, value):
+        if value < cls._LINEAR_LIMIT:
+            return value
+        exponent = value.bit_length() - 5
+        return exponent * cls.SUB_BUCKETS + (value >> exponent)
+
+    @classmethod
+    def bucket_upper_bound(cls, index):
+        if index < cls._LINEAR_LIMIT:
+            return index
+        exponent, offset = divmod(index, cls.SUB_BUCKETS)
+        exponent -= 1
+        return ((offset + cls.SUB_BUCKETS + 1) << exponent) - 1
+
+    def record(self, value):
+        # 与 bucket_index 相同的计算，内联以减少热路径上的一次方法调用
+        if value < 32:
+            self.counts[value] += 1
+        else:
+            exponent = value.bit_length() - 5
+            self.counts[exponent * 16 + (value >> exponent)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        if not self.count:
+            return 0
+        target = max(1, -(-self.count * p // 100))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(self.bucket_upper_bound(index), self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_ns": self.total // self.count if self.count else 0,
+            "p50_ns": self.percentile(50),
+            "p95_ns": self.percentile(95),
+            "p99_ns": self.percentile(99),
+            "max_ns": self.max,
+        }
+
+    def reset(self):
+        self.__init__()
+
+class TimerRegistry:
+    """按函数全名（模块.限定名）汇总延迟直方图，提供快照、文本报告和定时输出"""
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        with self._lock:
+            return self._histograms.setdefault(name, LatencyHistogram())
+
+    def snapshot(self, reset=False):
+        with self._lock:
+            items = list(self._histograms.items())
+        result = {}
+        for name, hist in items:
+            result[name] = hist.snapshot()
+            if reset:
+                hist.reset()
         return result
-    return wrapper
 
-@timer
+    def report(self, reset=False):
+        lines = [f"{'函数':<30}{'次数':>10}{'p50(ms)':>12}{'p95(ms)':>12}{'p99(ms)':>12}{'max(ms)':>12}"]
+        for name, snap in sorted(self.snapshot(reset).items()):
+            lines.append(f"{name:<30}{snap['count']:>10}"
+                         f"{snap['p50_ns'] / 1e6:>12.3f}{snap['p95_ns'] / 1e6:>12.3f}"
+                         f"{snap['p99_ns'] / 1e6:>12.3f}{snap['max_ns'] / 1e6:>12.3f}")
+        return "\n".join(lines)
+
+    def start_dumper(self, interval=60.0, stream=None, reset=True):
+        """启动后台线程，每 interval 秒输出一次报告；返回的 Event 调用 set() 即停止"""
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                print(self.report(reset), file=stream or sys.stdout, flush=True)
+
+        threading.Thread(target=run, name="timer-dumper", daemon=True).start()
+        return stop
+
+TIMER_REGISTRY = TimerRegistry()
+
+def timer(func=None, *, verbose=False, registry=None):
+    """计时装饰器
+
+    使用 perf_counter_ns 计时，结果累加到 registry（默认 TIMER_REGISTRY）中该函数的直方图，
+    通过 TIMER_REGISTRY.report() 查看 p50/p95/p99/max；verbose=True 时每次调用都打印耗时。
+    """
+    def decorator(func):
+        hist = (registry or TIMER_REGISTRY).histogram(f"{func.__module__}.{func.__qualname__}")
+        record = hist.record
+        clock = time.perf_counter_ns
+
+        if inspect.iscoroutinefunction(func):
+            # 协程函数：返回协程包装器，耗时包含 await 期间的等待
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = clock()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    elapsed = clock() - start
+                    record(elapsed)
+                    if verbose:
+                        print(f"{func.__name__} 执行耗时: {elapsed / 1e9:.6f}秒")
+            async_wrapper.histogram = hist
+            return async_wrapper
+
+        @functools.wraps(func)  # 保留原函数的元信息
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                record(elapsed)
+                if verbose:
+                    print(f"{func.__name__} 执行耗时: {elapsed / 1e9:.6f}秒")
+        wrapper.histogram = hist
+        return wrapper
+
+    decorator.fusion_stage = ("timer", {"verbose": verbose, "registry": registry})
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+@timer(verbose=True)
 def slow_function():
     """模拟耗时函数"""
     time.sleep(1)
     return "执行完成"
 
+@timer
+def add_numbers(a, b):
+    """热点小函数：只累加直方图，不打印"""
+    return a + b
+
 # 3. 日志装饰器
 def logger(func):
     """日志装饰器"""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            print(f"[{datetime.now()}] 调用函数: {func.__name__}")
+            print(f"参数: args={args}, kwargs={kwargs}")
+            try:
+                result = await func(*args, **kwargs)
+                print(f"返回结果: {result}")
+                return result
+            except Exception as e:
+                print(f"函数执行出错: {e}")
+                raise
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         print(f"[{datetime.now()}] 调用函数: {func.__name__}")
@@ -56,28 +226,438 @@ def logger(func):
 def calculate_sum(a, b):
     return a + b
 
-# 4. 带参数的装饰器
-def retry(max_attempts=3):
-    """重试装饰器 - 装饰器本身带参数"""
+# 结构化日志：每次调用只产生一条记录，格式化和I/O都交给后台线程
+class LogRecord:
+    """一次函数调用的日志记录，参数只保存引用，真正写出时才格式化"""
+    __slots__ = ("timestamp", "level", "func_name", "args", "kwargs", "result", "error", "duration")
+
+    def __init__(self, timestamp, level, func_name, args, kwargs, result, error, duration):
+        self.timestamp = timestamp
+        self.level = level
+        self.func_name = func_name
+        self.args = args
+        self.kwargs = kwargs
+        self.result = result
+        self.error = error
+        self.duration = duration
+
+    def format(self):
+        record = {
+            "ts": datetime.fromtimestamp(self.timestamp).isoformat(),
+            "level": self.level,
+            "func": self.func_name,
+            "args": repr(self.args),
+            "kwargs": repr(self.kwargs),
+        }
+        if self.error is not None:
+            record["error"] = repr(self.error)
+        else:
+            record["result"] = repr(self.result)
+        if self.duration is not None:
+            record["duration_ms"] = round(self.duration * 1000, 3)
+        return json.dumps(record, ensure_ascii=False)
+
+_SINK_STOP = object()
+
+class QueueLogSink:
+    """基于队列的异步日志输出：调用线程只做一次入队，后台线程批量格式化并写出
+
+    队列最多缓存 maxsize 条记录，写出跟不上时新记录直接丢弃而不阻塞调用线程；
+    dropped 统计因队列已满或写出失败而丢弃的记录数。
+    """
+    def __init__(self, stream=None, batch_size=256, maxsize=100000):
+        self._stream = stream  # None 表示写到当前的 sys.stdout
+        self.batch_size = batch_size
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self._thread.start()
+
+    def emit(self, record):
+        if self._closed:
+            self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=None):
+        """等待此前入队的记录全部写出；关闭后队列已写完，直接返回 True"""
+        if self._closed:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)  # 控制项不能丢，队列满时等待后台线程腾出空间
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_SINK_STOP)
+            self._thread.join()
+
+    def _run(self):
+        get, get_nowait = self._queue.get, self._queue.get_nowait
+        while True:
+            batch = [get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(get_nowait())
+                except queue.Empty:
+                    break
+
+            lines, waiters, stop = [], [], False
+            for item in batch:
+                if item is _SINK_STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    lines.append(self._format(item))
+            try:
+                if lines:
+                    stream = self._stream or sys.stdout
+                    stream.write("\n".join(lines) + "\n")
+                    stream.flush()
+                    self.written += len(lines)
+            except Exception:
+                self.dropped += len(lines)  # 写出失败只丢弃这一批，后台线程继续运行
+            finally:
+                for waiter in waiters:
+                    waiter.set()
+            if stop:
+                return
+
+    @staticmethod
+    def _format(record):
+        """格式化单条记录；参数或返回值的 __repr__ 抛异常时退化为只含函数名的记录"""
+        try:
+            return record.format()
+        except Exception as e:
+            return json.dumps({"func": getattr(record, "func_name", None),
+                               "format_error": f"{type(e).__name__}: {e}"}, ensure_ascii=False)
+
+_default_sink = None
+_default_sink_lock = threading.Lock()
+
+def get_default_sink():
+    """获取进程共享的日志输出，首次使用时才启动后台线程"""
+    global _default_sink
+    with _default_sink_lock:
+        if _default_sink is None:
+            _default_sink = QueueLogSink()
+            atexit.register(_default_sink.close)  # 退出前写完队列中的记录
+        return _default_sink
+
+def structured_logger(func=None, *, sample_rate=1, level="INFO", sink=None):
+    """结构化日志装饰器
+
+    sample_rate=N 表示每 N 次成功调用记录一次，异常调用总是记录；
+    记录写入 sink（默认为共享的 QueueLogSink），调用线程不会阻塞在I/O上。
+    """
+    if sample_rate < 1:
+        raise ValueError("sample_rate必须大于等于1")
+
     def decorator(func):
+        name = func.__name__
+        counter = itertools.count()
+
+        def emit(args, kwargs, result, error, duration):
+            (sink or get_default_sink()).emit(
+                LogRecord(time.time(), "ERROR" if error is not None else level,
+                          name, args, kwargs, result, error, duration))
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                sampled = next(counter) % sample_rate == 0
+                start = time.perf_counter() if sampled else None
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    emit(args, kwargs, None, e, time.perf_counter() - start if sampled else None)
+                    raise
+                if sampled:
+                    emit(args, kwargs, result, None, time.perf_counter() - start)
+                return result
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            for attempt in range(max_attempts):
+            sampled = next(counter) % sample_rate == 0
+            if not sampled:
+                # 未被采样的调用走最短路径，只在出错时补一条记录
                 try:
                     return func(*args, **kwargs)
                 except Exception as e:
-                    print(f"第{attempt + 1}次尝试失败: {e}")
-                    if attempt == max_attempts - 1:
-                        print("达到最大重试次数，放弃执行")
+                    emit(args, kwargs, None, e, None)
+                    raise
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                emit(args, kwargs, None, e, time.perf_counter() - start)
+                raise
+            emit(args, kwargs, result, None, time.perf_counter() - start)
+            return result
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+@structured_logger(sample_rate=2)
+def calculate_product(a, b):
+    return a * b
+
+# 4. 带参数的装饰器
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，调用被快速拒绝"""
+    pass
+
+class TokenBucketLimiter:
+    """令牌桶：平均速率 rate 次/秒，允许突发 capacity 次"""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take_locked(self):
+        """补充令牌后尝试取走一个：成功返回0，否则返回需要等待的秒数（调用方持有 _lock）"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def try_acquire(self):
+        """获取一个令牌：成功返回0，否则返回需要等待的秒数"""
+        with self._lock:
+            return self._take_locked()
+
+class RetryBudget(TokenBucketLimiter):
+    """进程级重试预算（令牌桶）
+
+    每次重试消耗一个令牌，令牌按 rate 个/秒补充、最多积攒 capacity 个。
+    下游整体故障时令牌很快耗尽，重试自动停止，避免把故障放大成重试风暴。
+    """
+    def __init__(self, rate=10.0, capacity=100):
+        super().__init__(rate, capacity)
+        self.granted = 0
+        self.rejected = 0
+
+    def try_acquire(self):
+        """获取一个令牌，返回是否允许这次重试"""
+        with self._lock:
+            if self._take_locked():
+                self.rejected += 1
+                return False
+            self.granted += 1
+            return True
+
+    def stats(self):
+        return {"tokens": round(self._tokens, 2), "granted": self.granted, "rejected": self.rejected}
+
+# 默认所有 retry 共享同一个进程级预算
+DEFAULT_RETRY_BUDGET = RetryBudget()
+
+class CircuitBreaker:
+    """熔断器：连续失败 failure_threshold 次后打开，
+    recovery_timeout 秒后半开，只放行一次试探调用"""
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            # 半开状态：同一时间只允许一个试探调用
+            if self._trial_in_flight:
+                self.rejected += 1
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """调用因非重试类异常结束：不计成功也不计失败，只释放试探名额"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self):
+        return {"state": self.state, "successes": self.successes, "failures": self.failures,
+                "rejected": self.rejected, "opened": self.opened}
+
+class _RetryPolicy:
+    """retry 的同步/异步包装器共用的决策逻辑"""
+    def __init__(self, max_attempts, base_delay, max_delay, backoff, jitter,
+                 exceptions, budget, breaker):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.jitter = jitter
+        self.exceptions = exceptions
+        self.budget = budget
+        self.breaker = breaker
+        # 监控计数器（多线程下为近似值）
+        self.stats = dict(calls=0, attempts=0, retries=0, successes=0, failures=0,
+                          budget_rejected=0, circuit_rejected=0)
+
+    def before_attempt(self):
+        self.stats["attempts"] += 1
+        if self.breaker is not None and not self.breaker.allow():
+            self.stats["circuit_rejected"] += 1
+            raise CircuitOpenError("熔断器已打开，快速失败")
+
+    def on_success(self):
+        self.stats["successes"] += 1
+        if self.breaker is not None:
+            self.breaker.record_success()
+
+    def on_abort(self):
+        if self.breaker is not None:
+            self.breaker.release()
+
+    def on_failure(self, attempt, error):
+        """返回下一次重试前的等待秒数；返回 None 表示放弃重试"""
+        self.stats["failures"] += 1
+        print(f"第{attempt + 1}次尝试失败: {error}")
+        if self.breaker is not None:
+            self.breaker.record_failure()
+            if self.breaker.state == CircuitBreaker.OPEN:
+                print("熔断器已打开，放弃执行")
+                return None
+        if attempt >= self.max_attempts - 1:
+            print("达到最大重试次数，放弃执行")
+            return None
+        if self.budget is not None and not self.budget.try_acquire():
+            self.stats["budget_rejected"] += 1
+            print("重试预算耗尽，放弃执行")
+            return None
+        self.stats["retries"] += 1
+        delay = min(self.max_delay, self.base_delay * self.backoff ** attempt)
+        if self.jitter:
+            delay = random.uniform(0, delay)  # full jitter：打散各调用方的重试时刻
+        return delay
+
+def retry(max_attempts=3, *, base_delay=0.5, max_delay=30.0, backoff=2.0, jitter=True,
+          exceptions=(Exception,), budget=DEFAULT_RETRY_BUDGET, breaker=None):
+    """重试装饰器 - 装饰器本身带参数
+
+    第 n 次重试前等待 [0, min(max_delay, base_delay * backoff**n)] 内的随机时长。
+    只有 exceptions 中列出的异常会触发重试；budget 为共享的重试令牌桶
+    （传 None 关闭）；breaker 为可选的 CircuitBreaker。
+    包装后的函数通过 retry_stats / budget / breaker 属性暴露监控数据。
+    """
+    def decorator(func):
+        policy = _RetryPolicy(max_attempts, base_delay, max_delay, backoff, jitter,
+                              exceptions, budget, breaker)
+
+        if inspect.iscoroutinefunction(func):
+            # 协程版本：用 asyncio.sleep 退避，等待期间不阻塞事件循环
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                policy.stats["calls"] += 1
+                attempt = 0
+                while True:
+                    policy.before_attempt()
+                    try:
+                        result = await func(*args, **kwargs)
+                    except exceptions as e:
+                        delay = policy.on_failure(attempt, e)
+                        if delay is None:
+                            raise
+                    except BaseException:
+                        policy.on_abort()
                         raise
-                    time.sleep(0.5)
+                    else:
+                        policy.on_success()
+                        return result
+                    await asyncio.sleep(delay)
+                    attempt += 1
+            wrapper = async_wrapper
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                policy.stats["calls"] += 1
+                attempt = 0
+                while True:
+                    policy.before_attempt()
+                    try:
+                        result = func(*args, **kwargs)
+                    except exceptions as e:
+                        delay = policy.on_failure(attempt, e)
+                        if delay is None:
+                            raise
+                    except BaseException:
+                        policy.on_abort()
+                        raise
+                    else:
+                        policy.on_success()
+                        return result
+                    time.sleep(delay)
+                    attempt += 1
+
+        wrapper.retry_stats = policy.stats
+        wrapper.budget = budget
+        wrapper.breaker = breaker
         return wrapper
+
+    decorator.fusion_stage = ("retry", {
+        "max_attempts": max_attempts, "base_delay": base_delay, "max_delay": max_delay,
+        "backoff": backoff, "jitter": jitter, "exceptions": exceptions,
+        "budget": budget, "breaker": breaker,
+    })
     return decorator
 
 @retry(max_attempts=3)
 def unreliable_function():
     """模拟不稳定的函数"""
-    import random
     if random.random() < 0.7:  # 70%的概率失败
         raise Exception("随机失败")
     return "成功执行"
@@ -98,26 +678,240 @@ class CountCalls:
 def greet(name):
     return f"Hello, {name}!"
 
+class _ThreadCallCounter:
+    """单个线程私有的计数单元，只有所属线程会写入，因此无需加锁"""
+    __slots__ = ("count", "by_signature")
+
+    def __init__(self):
+        self.count = 0
+        self.by_signature = Counter()
+
+class ShardedCountCalls(CountCalls):
+    """线程安全的调用计数：每个线程累加自己的计数单元，读取时再合并
+
+    调用路径上没有锁也没有I/O；by_signature=True 时额外按参数组合分别计数。
+    """
+    def __init__(self, func, *, by_signature=False):
+        self.func = func
+        self.by_signature = by_signature
+        self._local = threading.local()
+        self._cells = []
+        self._cells_lock = threading.Lock()
+        functools.update_wrapper(self, func)
+
+    def _new_cell(self):
+        cell = _ThreadCallCounter()
+        with self._cells_lock:
+            self._cells.append(cell)
+        self._local.cell = cell
+        return cell
+
+    def __call__(self, *args, **kwargs):
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._new_cell()
+        cell.count += 1
+        if self.by_signature:
+            cell.by_signature[self._signature(args, kwargs)] += 1
+        return self.func(*args, **kwargs)
+
+    @staticmethod
+    def _signature(args, kwargs):
+        """可读的参数组合键：(位置参数, 排序后的关键字参数)，不可哈希时退化为repr"""
+        key = (args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            key = (repr(args), repr(key[1]))
+        return key
+
+    @property
+    def count(self):
+        with self._cells_lock:
+            cells = list(self._cells)
+        return sum(cell.count for cell in cells)
+
+    def signature_counts(self):
+        """合并所有线程的按参数计数"""
+        with self._cells_lock:
+            cells = list(self._cells)
+        merged = Counter()
+        for cell in cells:
+            merged.update(cell.by_signature)
+        return merged
+
+    def reset(self):
+        """清零（与正在进行的调用并发时结果是近似的）"""
+        with self._cells_lock:
+            for cell in self._cells:
+                cell.count = 0
+                cell.by_signature.clear()
+
+@functools.partial(ShardedCountCalls, by_signature=True)
+def lookup_price(product_id):
+    return product_id * 10
+
 # 6. 缓存装饰器
-def memoize(func):
-    """缓存装饰器 - 记忆化"""
-    cache = {}
-    
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        # 创建缓存键
-        key = str(args) + str(sorted(kwargs.items()))
-        
-        if key in cache:
-            print(f"从缓存获取 {func.__name__} 的结果")
-            return cache[key]
-        
-        result = func(*args, **kwargs)
-        cache[key] = result
-        print(f"缓存 {func.__name__} 的结果")
-        return result
-    
-    return wrapper
+_MISSING = object()      # 缓存未命中的哨兵值
+_KWARGS_MARK = object()  # 分隔位置参数与关键字参数，避免 f(1, a=2) 与 f(1, ("a", 2)) 撞键
+_FROZEN_MARK = object()  # 标记冻结后的键，避免 f([1]) 与 f(list, ...) 这类真实可哈希参数撞键
+_REPR_MARK = object()    # 标记repr兜底键，避免与单个str参数的快速路径键撞键
+_FAST_TYPES = {int, str}
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize", "evictions", "expired"])
+
+def _freeze(value):
+    """把不可哈希的参数（list/dict/set）递归转换为可哈希的等价形式"""
+    if isinstance(value, dict):
+        return (dict, tuple(sorted((k, _freeze(v)) for k, v in value.items())))
+    if isinstance(value, (list, tuple)):
+        return (type(value), tuple(_freeze(v) for v in value))
+    if isinstance(value, (set, frozenset)):
+        return (frozenset, frozenset(_freeze(v) for v in value))
+    return value
+
+def _make_key(args, kwargs):
+    """构造缓存键：优先使用可哈希元组，不可哈希时退化为冻结结构或repr"""
+    if not kwargs and len(args) == 1 and type(args[0]) in _FAST_TYPES:
+        return args[0]  # 最常见的单参数情况，直接用参数本身做键
+    key = args
+    if kwargs:
+        key += (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+    try:
+        hash(key)
+    except TypeError:
+        try:
+            frozen = (_FROZEN_MARK, _freeze(key))
+            hash(frozen)
+            key = frozen
+        except TypeError:
+            key = (_REPR_MARK, repr(key))  # 最后的兜底方案
+    return key
+
+class _CacheShard:
+    """缓存分片：一个有序字典 + 一把锁（非线程安全模式下为空锁）"""
+    __slots__ = ("data", "lock", "maxsize", "hits", "misses", "evictions", "expired")
+
+    def __init__(self, maxsize, lock):
+        self.data = OrderedDict()
+        self.lock = lock
+        self.maxsize = maxsize
+        self.hits = self.misses = self.evictions = self.expired = 0
+
+    def get(self, key, now):
+        with self.lock:
+            entry = self.data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return _MISSING
+            value, expire_at = entry
+            if expire_at is not None and now >= expire_at:
+                del self.data[key]
+                self.expired += 1
+                self.misses += 1
+                return _MISSING
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, expire_at):
+        with self.lock:
+            data = self.data
+            if key in data:
+                data.move_to_end(key)
+            data[key] = (value, expire_at)
+            if self.maxsize is not None and len(data) > self.maxsize:
+                data.popitem(last=False)  # 淘汰最久未使用的条目
+                self.evictions += 1
+
+class CacheEngine:
+    """有界LRU缓存引擎，支持条目TTL和分段加锁的线程安全模式
+
+    线程安全模式下按键的哈希值把条目分散到多个分片，每个分片各自加锁，
+    maxsize 按分片平均分配，因此总容量是近似上限。
+    """
+    def __init__(self, maxsize=None, ttl=None, thread_safe=False, stripes=16):
+        if maxsize is not None and maxsize <= 0:
+            raise ValueError("maxsize必须大于0")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl必须大于0")
+        count = max(1, stripes) if thread_safe else 1
+        if maxsize is not None:
+            count = min(count, maxsize)
+        shard_max = None if maxsize is None else -(-maxsize // count)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._shards = [
+            _CacheShard(shard_max, threading.Lock() if thread_safe else nullcontext())
+            for _ in range(count)
+        ]
+
+    def _shard(self, key):
+        shards = self._shards
+        return shards[hash(key) % len(shards)] if len(shards) > 1 else shards[0]
+
+    def get(self, key, default=_MISSING):
+        now = time.monotonic() if self.ttl is not None else None
+        value = self._shard(key).get(key, now)
+        return default if value is _MISSING else value
+
+    def put(self, key, value):
+        expire_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._shard(key).put(key, value, expire_at)
+
+    def clear(self):
+        for shard in self._shards:
+            with shard.lock:
+                shard.data.clear()
+                shard.hits = shard.misses = shard.evictions = shard.expired = 0
+
+    def info(self):
+        shards = self._shards
+        return CacheInfo(
+            hits=sum(s.hits for s in shards),
+            misses=sum(s.misses for s in shards),
+            maxsize=self.maxsize,
+            currsize=sum(len(s.data) for s in shards),
+            evictions=sum(s.evictions for s in shards),
+            expired=sum(s.expired for s in shards),
+        )
+
+def memoize(func=None, *, maxsize=None, ttl=None, thread_safe=False, stripes=16, verbose=False):
+    """缓存装饰器 - 记忆化
+
+    既可以直接 @memoize 使用，也可以 @memoize(maxsize=1024, ttl=60) 配置：
+    maxsize 为最大条目数（LRU淘汰），ttl 为条目存活秒数，
+    thread_safe 开启分段加锁，verbose 打印每次命中/缓存信息。
+    """
+    def decorator(func):
+        engine = CacheEngine(maxsize, ttl, thread_safe, stripes)
+        get, put = engine.get, engine.put
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = _make_key(args, kwargs)
+            result = get(key)
+            if result is not _MISSING:
+                if verbose:
+                    print(f"从缓存获取 {name} 的结果")
+                return result
+
+            result = func(*args, **kwargs)
+            put(key, result)
+            if verbose:
+                print(f"缓存 {name} 的结果")
+            return result
+
+        wrapper.cache_info = engine.info
+        wrapper.cache_clear = engine.clear
+        wrapper.cache_engine = engine
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
 
 @memoize
 def fibonacci(n):
@@ -126,30 +920,264 @@ def fibonacci(n):
         return n
     return fibonacci(n - 1) + fibonacci(n - 2)
 
+def fibonacci_iterative(n):
+    """斐波那契数列（迭代版本，O(n)次大整数加法）"""
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+
+def _fib_double(a, b, bit):
+    """已知 (F(k), F(k+1))，求 (F(2k+bit), F(2k+bit+1))"""
+    c = a * (2 * b - a)   # F(2k)
+    d = a * a + b * b     # F(2k+1)
+    return (d, c + d) if bit else (c, d)
+
+def fibonacci_fast(n):
+    """斐波那契数列（快速倍增，O(log n)次大整数乘法，无递归）"""
+    if n < 0:
+        raise ValueError("n必须是非负整数")
+    a, b = 0, 1
+    for bit in bin(n)[2:]:
+        a, b = _fib_double(a, b, bit == "1")
+    return a
+
+def fibonacci_batch(indices, step_limit=32):
+    """批量计算多个下标的斐波那契数，返回 {n: F(n)}
+
+    下标从小到大处理：与上一个结果相距不超过 step_limit 时直接向前累加；
+    否则用快速倍增，并缓存倍增过程中的前缀结果 F(n >> j)，供二进制高位相同的下标复用。
+    """
+    prefix_cache = {0: (0, 1)}
+
+    def pair(n):
+        chain = []
+        while n not in prefix_cache:
+            chain.append(n)
+            n >>= 1
+        a, b = prefix_cache[n]
+        for m in reversed(chain):
+            a, b = _fib_double(a, b, m & 1)
+            prefix_cache[m] = (a, b)
+        return a, b
+
+    results = {}
+    last_n, last_pair = None, None
+    for n in sorted(set(indices)):
+        if n < 0:
+            raise ValueError("n必须是非负整数")
+        if last_n is not None and n - last_n <= step_limit:
+            a, b = last_pair
+            for _ in range(n - last_n):
+                a, b = b, a + b
+        else:
+            a, b = pair(n)
+        results[n] = a
+        last_n, last_pair = n, (a, b)
+    return results
+
+def benchmark_fibonacci(sizes=(100, 1000, 10000, 100000, 1000000), iterative_limit=1000000, memo_limit=20000):
+    """对比递归+memoize、functools.lru_cache、迭代和快速倍增的耗时（冷缓存）
+
+    递归版本从小到大分段预热缓存，每段递归深度都低于解释器限制，计入总耗时；
+    它们要缓存全部 F(0..n)，占用 O(n²) 位内存，因此只跑到 memo_limit。
+    迭代版本只跑到 iterative_limit。
+    """
+    def make_memoized():
+        @memoize
+        def fib(n):
+            return n if n < 2 else fib(n - 1) + fib(n - 2)
+        return fib
+
+    def make_lru_cached():
+        @functools.lru_cache(maxsize=None)
+        def fib(n):
+            return n if n < 2 else fib(n - 1) + fib(n - 2)
+        return fib
+
+    step = max(1, sys.getrecursionlimit() // 4)
+
+    def warmed(fib):
+        def run_warmed(n):
+            for k in range(step, n, step):
+                fib(k)  # 每次只比已缓存的部分深 step 层
+            return fib(n)
+        return run_warmed
+
+    def run(label, fn, n):
+        start = time.perf_counter()
+        try:
+            fn(n)
+        except RecursionError:
+            return f"{label}: 递归过深"
+        return f"{label}: {(time.perf_counter() - start) * 1000:.3f}ms"
+
+    for n in sizes:
+        row = []
+        if n <= memo_limit:
+            row.append(run("递归+memoize", warmed(make_memoized()), n))
+            row.append(run("lru_cache", warmed(make_lru_cached()), n))
+        if n <= iterative_limit:
+            row.append(run("迭代", fibonacci_iterative, n))
+        row.append(run("快速倍增", fibonacci_fast, n))
+        print(f"n={n}: " + ", ".join(row))
+
+    indices = list(range(0, max(sizes), max(1, max(sizes) // 100)))
+    start = time.perf_counter()
+    for n in indices:
+        fibonacci_fast(n)
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    fibonacci_batch(indices)
+    batch = time.perf_counter() - start
+    print(f"{len(indices)}个下标: 逐个快速倍增 {single * 1000:.1f}ms, 批量 {batch * 1000:.1f}ms")
+
 # 7. 权限检查装饰器
-def require_permission(permission):
-    """权限检查装饰器"""
+class PermissionRegistry:
+    """权限引擎：每个权限名对应一个二进制位，角色预先展开为位掩码并缓存
+
+    权限名的位一旦分配就不再改变；定义或修改角色会使缓存的展开结果失效（version 加一）。
+    """
+    def __init__(self):
+        self._bits = {}
+        self._roles = {}
+        self._expanded = {}  # 角色名 -> 展开后的位掩码
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def bit(self, name):
+        bit = self._bits.get(name)
+        if bit is None:
+            with self._lock:
+                bit = self._bits.setdefault(name, 1 << len(self._bits))
+        return bit
+
+    def mask(self, names):
+        """不展开角色，直接把权限名集合转换为位掩码"""
+        result = 0
+        for name in names:
+            result |= self.bit(name)
+        return result
+
+    def define_role(self, role, permissions):
+        """定义角色包含的权限，permissions 中也可以引用其他角色"""
+        with self._lock:
+            self._roles[role] = frozenset(permissions)
+            self._expanded.clear()
+            self.version += 1
+
+    def expand(self, names):
+        """把权限名和角色名展开为完整的位掩码
+
+        只缓存每个角色的展开结果，普通权限名直接按位或，不会为每个用户的权限集合常驻一份缓存。
+        """
+        roles = self._roles
+        result = 0
+        for name in names:
+            result |= self._role_mask(name) if name in roles else self.bit(name)
+        return result
+
+    def _role_mask(self, role):
+        cached = self._expanded.get(role)
+        if cached is not None:
+            return cached
+        version = self.version
+        result, seen, pending = 0, set(), [role]
+        while pending:
+            name = pending.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            result |= self.bit(name)
+            pending.extend(self._roles.get(name, ()))
+        with self._lock:
+            # 展开期间角色定义发生变化时结果可能已过期，不写入缓存
+            if self.version == version:
+                self._expanded[role] = result
+        return result
+
+PERMISSIONS = PermissionRegistry()
+
+def require_permission(*permissions):
+    """权限检查装饰器
+
+    可以同时要求多个权限；所需权限在装饰时就编译为位掩码，
+    对 User 对象的检查只是一次按位与运算。
+    """
+    required = PERMISSIONS.mask(permissions)
+    message = f"需要权限: {', '.join(permissions)}"
+
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             # 这里假设第一个参数是用户对象
             user = args[0] if args else None
-            if user and hasattr(user, 'permissions') and permission in user.permissions:
-                return func(*args, **kwargs)
+            mask = getattr(user, 'permission_mask', None)
+            if mask is not None:
+                allowed = mask & required == required
             else:
-                raise PermissionError(f"需要权限: {permission}")
+                # 兼容只有 permissions 列表的普通对象
+                granted = getattr(user, 'permissions', None)
+                allowed = bool(user) and granted is not None and all(p in granted for p in permissions)
+            if allowed:
+                return func(*args, **kwargs)
+            raise PermissionError(message)
         return wrapper
     return decorator
 
 class User:
     def __init__(self, name, permissions):
         self.name = name
-        self.permissions = permissions
+        self.permissions = frozenset(permissions)  # 构造时规范化为不可变集合
+        self._mask = None
+        self._mask_version = -1
+
+    @property
+    def permission_mask(self):
+        """包含角色展开结果的权限位掩码，角色定义变化后自动重新计算
+
+        位的分配只在 PERMISSIONS 内有效，require_permission 也按它编译所需掩码。
+        """
+        registry = PERMISSIONS
+        if self._mask_version != registry.version:
+            self._mask = registry.expand(self.permissions)
+            self._mask_version = registry.version
+        return self._mask
+
+PERMISSIONS.define_role("admin", ["read", "write", "delete"])
 
 @require_permission("admin")
 def delete_user(user, target_user_id):
     return f"{user.name} 删除了用户 {target_user_id}"
 
+@require_permission("read", "write")
+def edit_document(user, doc_id):
+    return f"{user.name} 编辑了文档 {doc_id}"
+
+def benchmark_permissions(permission_count=10000, checks=100000):
+    """每个用户拥有 permission_count 个权限时，对比列表扫描、集合与位掩码的检查耗时"""
+    registry = PermissionRegistry()
+    names = [f"perm_{i}" for i in range(permission_count)]
+    required = names[-3:]  # 列表扫描的最坏情况：所需权限排在最后
+    as_list, as_set = list(names), frozenset(names)
+    required_mask = registry.mask(required)
+    mask = registry.expand(names)  # 使用独立的注册表，避免向全局 PERMISSIONS 注册大量权限位
+
+    cases = [
+        ("列表扫描", lambda: all(p in as_list for p in required)),
+        ("frozenset", lambda: all(p in as_set for p in required)),
+        ("位掩码", lambda: mask & required_mask == required_mask),
+    ]
+    results = {}
+    for label, check in cases:
+        count = checks if label != "列表扫描" else max(1, checks // 100)
+        start = time.perf_counter()
+        for _ in range(count):
+            check()
+        results[label] = (time.perf_counter() - start) / count * 1e9
+        print(f"{label}: {results[label]:.0f} ns/次")
+    return results
+
 # 8. 多个装饰器组合
 @timer
 @logger
@@ -160,6 +1188,267 @@ def complex_function(x, y):
         raise ValueError("x不能为负数")
     return x ** y
 
+# 9. 异步装饰器
+# timer / logger / retry 会自动识别 async def 函数并返回协程包装器
+@timer
+@logger
+@retry(max_attempts=3)
+async def fetch_remote(resource_id):
+    """模拟不稳定的异步I/O调用"""
+    await asyncio.sleep(0.01)
+    if random.random() < 0.3:
+        raise ConnectionError(f"获取 {resource_id} 超时")
+    return f"resource-{resource_id}"
+
+async def fetch_many(resource_ids):
+    """并发获取多个资源，某个请求的重试等待不会阻塞其他请求"""
+    return await asyncio.gather(*(fetch_remote(rid) for rid in resource_ids),
+                                return_exceptions=True)
+
+# 10. 熔断器与重试预算
+payment_breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=0.2)
+
+@retry(max_attempts=5, base_delay=0.01, exceptions=(ConnectionError,), breaker=payment_breaker)
+def call_payment_service(healthy):
+    """模拟下游支付服务，healthy=False 时总是连接失败"""
+    if not healthy:
+        raise ConnectionError("支付服务不可用")
+    return "支付成功"
+
+# 11. 限流装饰器
+class RateLimitExceeded(Exception):
+    """非阻塞模式下超出调用频率限制"""
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"调用过于频繁，请在 {retry_after:.3f} 秒后重试")
+
+class SlidingWindowLimiter:
+    """滑动窗口日志：任意 period 秒内最多 max_calls 次
+
+    每次调用的时间戳入队一次、出队一次，均摊 O(1)。
+    """
+    def __init__(self, max_calls, period):
+        self.max_calls = max_calls
+        self.period = period
+        self._log = deque()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            log = self._log
+            boundary = now - self.period
+            while log and log[0] <= boundary:
+                log.popleft()
+            if len(log) < self.max_calls:
+                log.append(now)
+                return 0.0
+            return log[0] - boundary
+
+def rate_limit(calls, period=1.0, *, mode="token_bucket", block=True, key=None, max_keys=10000):
+    """限流装饰器 - 每 period 秒最多 calls 次
+
+    mode 为 "token_bucket" 或 "sliding_window"；block=True 时等待到可以调用，
+    否则抛出 RateLimitExceeded。key 是与被装饰函数同签名的函数，返回值相同的调用
+    共享一个限流器（例如 key=lambda user, *args, **kwargs: user.name 实现按用户限流），
+    最多保留 max_keys 个最近使用的键。
+    """
+    if calls <= 0:
+        raise ValueError("calls必须大于0")
+    if period <= 0:
+        raise ValueError("period必须大于0")
+    if mode == "token_bucket":
+        make_limiter = lambda: TokenBucketLimiter(calls / period, calls)
+    elif mode == "sliding_window":
+        make_limiter = lambda: SlidingWindowLimiter(calls, period)
+    else:
+        raise ValueError(f"未知的限流模式: {mode}")
+
+    def decorator(func):
+        if key is None:
+            shared = make_limiter()
+            get_limiter = lambda args, kwargs: shared
+        else:
+            limiters = CacheEngine(maxsize=max_keys)
+            lock = threading.Lock()
+
+            def get_limiter(args, kwargs):
+                limiter_key = key(*args, **kwargs)
+                with lock:
+                    limiter = limiters.get(limiter_key)
+                    if limiter is _MISSING:
+                        limiter = make_limiter()
+                        limiters.put(limiter_key, limiter)
+                    return limiter
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                limiter = get_limiter(args, kwargs)
+                wait = limiter.try_acquire()
+                while wait:
+                    if not block:
+                        raise RateLimitExceeded(wait)
+                    await asyncio.sleep(wait)
+                    wait = limiter.try_acquire()
+                return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            limiter = get_limiter(args, kwargs)
+            wait = limiter.try_acquire()
+            while wait:
+                if not block:
+                    raise RateLimitExceeded(wait)
+                time.sleep(wait)
+                wait = limiter.try_acquire()
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@rate_limit(5, 1.0, mode="sliding_window", block=False, key=lambda user, *args, **kwargs: user.name)
+def send_message(user, text):
+    """每个用户每秒最多发送5条消息"""
+    return f"{user.name}: {text}"
+
+# 12. 装饰器融合
+def _fusion_stage(decorator):
+    if decorator is timer:
+        return ("timer", {"verbose": False, "registry": None})
+    if decorator is logger:
+        return ("logger", {})
+    stage = getattr(decorator, "fusion_stage", None)
+    if stage is None:
+        raise TypeError(f"不支持融合的装饰器: {decorator!r}")
+    return stage
+
+def _fusion_body(stages, index, indent, is_async, lines):
+    """递归生成第 index 层及其内部各层的代码，每层把结果赋值给 _result"""
+    pad = "    " * indent
+    await_ = "await " if is_async else ""
+    if index == len(stages):
+        lines.append(f"{pad}_result = {await_}_func(*args, **kwargs)")
+        return
+
+    kind, options = stages[index]
+    i = index
+    if kind == "timer":
+        lines.append(f"{pad}_start{i} = _clock()")
+        lines.append(f"{pad}try:")
+        _fusion_body(stages, index + 1, indent + 1, is_async, lines)
+        lines.append(f"{pad}finally:")
+        lines.append(f"{pad}    _elapsed{i} = _clock() - _start{i}")
+        lines.append(f"{pad}    _record{i}(_elapsed{i})")
+        if options["verbose"]:
+            lines.append(f'{pad}    print(f"{{_name}} 执行耗时: {{_elapsed{i} / 1e9:.6f}}秒")')
+    elif kind == "logger":
+        lines.append(f'{pad}print(f"[{{_now()}}] 调用函数: {{_name}}")')
+        lines.append(f'{pad}print(f"参数: args={{args}}, kwargs={{kwargs}}")')
+        lines.append(f"{pad}try:")
+        _fusion_body(stages, index + 1, indent + 1, is_async, lines)
+        lines.append(f"{pad}except Exception as _error{i}:")
+        lines.append(f'{pad}    print(f"函数执行出错: {{_error{i}}}")')
+        lines.append(f"{pad}    raise")
+        lines.append(f'{pad}print(f"返回结果: {{_result}}")')
+    elif kind == "retry":
+        # 融合时已知是否配置了熔断器，没有熔断器时直接内联计数，省去方法调用
+        sleep = "await _async_sleep" if is_async else "_sleep"
+        has_breaker = options["breaker"] is not None
+        lines.append(f'{pad}_stats{i}["calls"] += 1')
+        lines.append(f"{pad}_attempt{i} = 0")
+        lines.append(f"{pad}while True:")
+        if has_breaker:
+            lines.append(f"{pad}    _policy{i}.before_attempt()")
+        else:
+            lines.append(f'{pad}    _stats{i}["attempts"] += 1')
+        lines.append(f"{pad}    try:")
+        _fusion_body(stages, index + 1, indent + 2, is_async, lines)
+        lines.append(f"{pad}    except _exceptions{i} as _error{i}:")
+        lines.append(f"{pad}        _delay{i} = _policy{i}.on_failure(_attempt{i}, _error{i})")
+        lines.append(f"{pad}        if _delay{i} is None:")
+        lines.append(f"{pad}            raise")
+        if has_breaker:
+            lines.append(f"{pad}    except BaseException:")
+            lines.append(f"{pad}        _policy{i}.on_abort()")
+            lines.append(f"{pad}        raise")
+            lines.append(f"{pad}    else:")
+            lines.append(f"{pad}        _policy{i}.on_success()")
+            lines.append(f"{pad}        break")
+        else:
+            lines.append(f"{pad}    else:")
+            lines.append(f'{pad}        _stats{i}["successes"] += 1')
+            lines.append(f"{pad}        break")
+        lines.append(f"{pad}    {sleep}(_delay{i})")
+        lines.append(f"{pad}    _attempt{i} += 1")
+    else:
+        raise TypeError(f"未知的融合阶段: {kind}")
+
+def fuse(*decorators):
+    """把 timer / logger / retry 的叠放组合融合成一个包装器
+
+    fuse(timer, logger, retry(max_attempts=2)) 与按同样顺序叠放三个装饰器语义相同
+    （第一个在最外层），但每次调用只有一层栈帧、只打包一次参数。
+    和 collections.namedtuple 一样，融合后的包装器通过生成源码再 exec 得到。
+    """
+    stages = [_fusion_stage(d) for d in decorators]
+
+    def decorator(func):
+        is_async = inspect.iscoroutinefunction(func)
+        namespace = {
+            "_func": func, "_name": func.__name__, "_clock": time.perf_counter_ns,
+            "_now": datetime.now, "_sleep": time.sleep, "_async_sleep": asyncio.sleep,
+        }
+        attributes = {}
+        for i, (kind, options) in enumerate(stages):
+            if kind == "timer":
+                registry = options["registry"] or TIMER_REGISTRY
+                hist = registry.histogram(f"{func.__module__}.{func.__qualname__}")
+                namespace[f"_record{i}"] = hist.record
+                attributes.setdefault("histogram", hist)
+            elif kind == "retry":
+                policy = _RetryPolicy(**options)
+                namespace[f"_policy{i}"] = policy
+                namespace[f"_stats{i}"] = policy.stats
+                namespace[f"_exceptions{i}"] = options["exceptions"]
+                attributes.setdefault("retry_stats", policy.stats)
+                attributes.setdefault("budget", options["budget"])
+                attributes.setdefault("breaker", options["breaker"])
+
+        lines = [f"{'async ' if is_async else ''}def _fused(*args, **kwargs):"]
+        _fusion_body(stages, 0, 1, is_async, lines)
+        lines.append("    return _result")
+        source = "\n".join(lines)
+        exec(source, namespace)
+
+        fused = functools.wraps(func)(namespace["_fused"])
+        for name, value in attributes.items():
+            setattr(fused, name, value)
+        fused.fusion_source = source
+        return fused
+    return decorator
+
+fused_complex_function = fuse(timer, logger, retry(max_attempts=2))(inspect.unwrap(complex_function))
+
+def benchmark_fusion(n=200000):
+    """对比叠放装饰器与融合包装器的单次调用开销（不含logger，避免打印主导耗时）"""
+    def add(a, b):
+        return a + b
+
+    baseline = add
+    stacked = timer(retry(max_attempts=2, budget=None)(retry(max_attempts=2, budget=None)(add)))
+    fused = fuse(timer, retry(max_attempts=2, budget=None), retry(max_attempts=2, budget=None))(add)
+
+    results = {}
+    for label, fn in [("原函数", baseline), ("叠放装饰器", stacked), ("融合包装器", fused)]:
+        start = time.perf_counter()
+        for i in range(n):
+            fn(i, 1)
+        results[label] = (time.perf_counter() - start) / n * 1e9
+    for label, ns in results.items():
+        print(f"{label}: {ns:.0f} ns/次")
+    return results
+
 # 练习和测试
 if __name__ == "__main__":
     print("=== 装饰器练习 ===")
@@ -187,11 +1476,27 @@ if __name__ == "__main__":
     print("\n5. 类装饰器:")
     greet("Alice")
     greet("Bob")
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lookup_price, [i % 3 for i in range(30000)]))
+    print(f"lookup_price 被调用 {lookup_price.count} 次, 按参数: {dict(lookup_price.signature_counts())}")
     
     # 练习6：缓存装饰器
     print("\n6. 缓存装饰器:")
     print(f"fibonacci(10) = {fibonacci(10)}")
     print(f"fibonacci(10) = {fibonacci(10)}")  # 第二次调用会使用缓存
+    print(f"缓存统计: {fibonacci.cache_info()}")
+    print(f"fibonacci_fast(10) = {fibonacci_fast(10)}, fibonacci_batch: {fibonacci_batch([5, 10, 90])}")
+    benchmark_fibonacci(sizes=(100, 1000, 10000, 100000))
+
+    @memoize(maxsize=2, ttl=60, verbose=True)
+    def square(x):
+        return x * x
+
+    for x in [2, 3, 2, 4]:  # 调用 square(4) 时 square(3) 被LRU淘汰
+        square(x)
+    print(f"有界缓存统计: {square.cache_info()}")
     
     # 练习7：权限装饰器
     print("\n7. 权限装饰器:")
@@ -200,8 +1505,11 @@ if __name__ == "__main__":
     
     try:
         print(delete_user(admin_user, "user123"))
+        print(edit_document(admin_user, "doc1"))  # 由 admin 角色展开得到 read/write
+        print(edit_document(normal_user, "doc1"))
     except PermissionError as e:
         print(f"权限错误: {e}")
+    benchmark_permissions()
     
     # 练习8：多装饰器组合
     print("\n8. 多装饰器组合:")
@@ -211,6 +1519,53 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"执行失败: {e}")
 
+    # 练习9：异步装饰器
+    print("\n9. 异步装饰器:")
+    results = asyncio.run(fetch_many(range(3)))
+    print(f"并发结果: {results}")
+
+    # 练习10：熔断器与重试预算
+    print("\n10. 熔断器与重试预算:")
+    for _ in range(2):
+        try:
+            call_payment_service(False)
+        except (ConnectionError, CircuitOpenError) as e:
+            print(f"调用失败: {type(e).__name__}: {e}")
+    time.sleep(0.25)  # 等待冷却后熔断器进入半开状态
+    print(call_payment_service(True))
+    print(f"重试统计: {dict(call_payment_service.retry_stats)}")
+    print(f"熔断器统计: {payment_breaker.stats()}")
+    print(f"重试预算: {DEFAULT_RETRY_BUDGET.stats()}")
+
+    # 练习11：结构化日志（采样 + 后台写出）
+    print("\n11. 结构化日志:")
+    for i in range(4):
+        calculate_product(i, 10)  # sample_rate=2，只记录其中一半
+    get_default_sink().flush()
+
+    # 练习12：延迟直方图
+    print("\n12. 延迟直方图:")
+    for i in range(10000):
+        add_numbers(i, i)
+    print(TIMER_REGISTRY.report())
+
+    # 练习13：限流装饰器
+    print("\n13. 限流装饰器:")
+    sent = 0
+    for i in range(8):
+        try:
+            send_message(normal_user, f"消息{i}")
+            sent += 1
+        except RateLimitExceeded as e:
+            print(f"{normal_user.name} 被限流: {e}")
+            break
+    print(f"{normal_user.name} 成功发送 {sent} 条, {admin_user.name}: {send_message(admin_user, 'hi')}")
+
+    # 练习14：装饰器融合
+    print("\n14. 装饰器融合:")
+    print(f"融合结果: {fused_complex_function(2, 3)}")
+    benchmark_fusion()
+
 # 进阶练习题
 """
 练习题：
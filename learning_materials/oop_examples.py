@@ -1,5 +1,35 @@
 # 面向对象编程学习素材和练习
 
+import io
+import os
+import json
+import sys
+import mmap
+import math
+import numbers
+import time
+import random
+import struct
+import tempfile
+import threading
+import bisect
+import itertools
+import tracemalloc
+from array import array
+from calendar import isleap
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, redirect_stdout
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from enum import IntEnum
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:  # 没有安装numpy时，BankAccountBatch 退回到 array 实现
+    np = None
+
 # 1. 基础类和对象
 class Person:
     """人员基础类"""
@@ -116,6 +146,1311 @@ class Book:
             return (self.title == other.title and 
                    self.author == other.author)
         return False
+    
+    def __hash__(self):
+        """与 __eq__ 保持一致：只由书名和作者决定（放入集合后不要再修改这两个属性）"""
+        return hash((self.title, self.author))
+
+# 6. 紧凑存储（__slots__ 和列式存储）
+# 加载数百万条人员记录时，每个实例的 __dict__ 要占几百字节。
+# __slots__ 类把属性放在固定槽位中；EmployeeTable 则按列存储，只在访问时生成轻量的行视图。
+_NO_PROJECTS = ()
+
+class CompactPerson:
+    """使用 __slots__ 的 Person，方法与 Person 完全相同"""
+    __slots__ = ("name", "age")
+
+    def __init__(self, name, age):
+        self.name = sys.intern(name)
+        self.age = age
+
+    introduce = Person.introduce
+    celebrate_birthday = Person.celebrate_birthday
+
+class CompactEmployee(CompactPerson):
+    """使用 __slots__ 的 Employee，projects 在第一次添加项目时才分配列表"""
+    __slots__ = ("employee_id", "department", "projects")
+
+    def __init__(self, name, age, employee_id, department):
+        super().__init__(name, age)
+        self.employee_id = employee_id
+        self.department = sys.intern(department)
+        self.projects = _NO_PROJECTS
+
+    def add_project(self, project_name):
+        if self.projects is _NO_PROJECTS:
+            self.projects = []
+        self.projects.append(project_name)
+
+    get_work_info = Employee.get_work_info
+
+class CompactDeveloper(CompactEmployee):
+    """使用 __slots__ 的 Developer，编程语言保存为驻留字符串的元组"""
+    __slots__ = ("programming_languages",)
+
+    def __init__(self, name, age, employee_id, department, programming_languages):
+        super().__init__(name, age, employee_id, department)
+        self.programming_languages = tuple(sys.intern(lang) for lang in programming_languages)
+
+    write_code = Developer.write_code
+
+class EmployeeRow:
+    """EmployeeTable 中一行的轻量视图，只保存表和行号"""
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    @property
+    def name(self):
+        return self._table.names[self._index]
+
+    @property
+    def age(self):
+        return self._table.ages[self._index]
+
+    @property
+    def employee_id(self):
+        return self._table.employee_ids[self._index]
+
+    @property
+    def department(self):
+        table = self._table
+        return table.department_names[table.department_codes[self._index]]
+
+    @property
+    def projects(self):
+        return self._table.projects.get(self._index, _NO_PROJECTS)
+
+    def add_project(self, project_name):
+        self._table.projects.setdefault(self._index, []).append(project_name)
+
+    introduce = Person.introduce
+    get_work_info = Employee.get_work_info
+
+    def __repr__(self):
+        return f"EmployeeRow({self.name!r}, {self.age}, {self.employee_id!r}, {self.department!r})"
+
+class EmployeeTable:
+    """列式员工表：姓名为驻留字符串列表（重名共享一份），工号每行唯一不驻留，年龄为无符号短整型数组，
+    部门做字典编码（每行只存一个整数编号），项目只为有项目的行单独保存"""
+    def __init__(self):
+        self.names = []
+        self.ages = array("H")
+        self.employee_ids = []
+        self.department_codes = array("H")
+        self.department_names = []
+        self._department_index = {}
+        self.projects = {}
+
+    def _department_code(self, department):
+        code = self._department_index.get(department)
+        if code is None:
+            code = len(self.department_names)
+            self.department_names.append(sys.intern(department))
+            self._department_index[department] = code
+        return code
+
+    def append(self, name, age, employee_id, department):
+        self.names.append(sys.intern(name))
+        self.ages.append(age)
+        self.employee_ids.append(employee_id)  # 工号不会重复，驻留只会撑大解释器的驻留表
+        self.department_codes.append(self._department_code(department))
+        return EmployeeRow(self, len(self.names) - 1)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.names)
+        if not 0 <= index < len(self.names):
+            raise IndexError("行号超出范围")
+        return EmployeeRow(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.names)):
+            yield EmployeeRow(self, index)
+
+def benchmark_employee_memory(n=100000):
+    """用 tracemalloc 比较三种表示方式存放 n 个员工时的内存占用"""
+    departments = ["技术部", "市场部", "财务部", "人事部"]
+    records = [(f"员工{i % 5000}", 20 + i % 40, f"E{i:07d}", departments[i % 4]) for i in range(n)]
+
+    def measure(build):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        container = build()
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del container
+        return used
+
+    def build_table():
+        table = EmployeeTable()
+        for record in records:
+            table.append(*record)
+        return table
+
+    results = {
+        "Employee": measure(lambda: [Employee(*record) for record in records]),
+        "CompactEmployee": measure(lambda: [CompactEmployee(*record) for record in records]),
+        "EmployeeTable": measure(build_table),
+    }
+    for label, used in results.items():
+        print(f"{label}: {used / n:.1f} 字节/人")
+    return results
+
+# 7. 带索引的员工登记表
+class EmployeeRegistry:
+    """员工集合：按工号、部门、编程语言和项目维护哈希索引
+
+    组合查询时从最小的候选集合开始做集合交集，不需要扫描全部员工。
+    员工的项目请通过 registry.add_project() 添加，以便同步更新项目索引。
+    """
+    def __init__(self, employees=()):
+        self._by_id = {}
+        self._by_department = defaultdict(set)
+        self._by_language = defaultdict(set)
+        self._by_project = defaultdict(set)
+        for employee in employees:
+            self.add(employee)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, employee_id):
+        return employee_id in self._by_id
+
+    def get(self, employee_id):
+        return self._by_id.get(employee_id)
+
+    def add(self, employee):
+        employee_id = employee.employee_id
+        if employee_id in self._by_id:
+            raise ValueError(f"工号 {employee_id} 已存在")
+        self._by_id[employee_id] = employee
+        self._by_department[employee.department].add(employee_id)
+        for language in getattr(employee, "programming_languages", ()):
+            self._by_language[language].add(employee_id)
+        for project in employee.projects:
+            self._by_project[project].add(employee_id)
+
+    def remove(self, employee_id):
+        employee = self._by_id.pop(employee_id)
+        self._discard(self._by_department, employee.department, employee_id)
+        for language in getattr(employee, "programming_languages", ()):
+            self._discard(self._by_language, language, employee_id)
+        for project in employee.projects:
+            self._discard(self._by_project, project, employee_id)
+        return employee
+
+    @staticmethod
+    def _discard(index, key, employee_id):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(employee_id)
+            if not ids:
+                del index[key]  # 不保留空集合，避免索引无限增长
+
+    def add_project(self, employee_id, project_name):
+        self._by_id[employee_id].add_project(project_name)
+        self._by_project[project_name].add(employee_id)
+
+    def find(self, department=None, language=None, project=None):
+        """按部门、编程语言、项目的任意组合查询，返回员工列表"""
+        candidates = []
+        for index, key in ((self._by_department, department),
+                           (self._by_language, language),
+                           (self._by_project, project)):
+            if key is not None:
+                ids = index.get(key)
+                if not ids:
+                    return []
+                candidates.append(ids)
+        if not candidates:
+            return list(self._by_id.values())
+        candidates.sort(key=len)
+        result = candidates[0].intersection(*candidates[1:])
+        return [self._by_id[employee_id] for employee_id in result]
+
+# 8. 线程安全的交易引擎
+class TxStatus(IntEnum):
+    """交易结果码，批量接口返回由这些整数组成的数组，不再拼接提示字符串"""
+    OK = 0
+    INVALID_AMOUNT = 1
+    INSUFFICIENT_FUNDS = 2
+    SAME_ACCOUNT = 3
+
+class TxKind(IntEnum):
+    DEPOSIT = 0
+    WITHDRAW = 1
+    TRANSFER = 2
+
+Transaction = namedtuple("Transaction", ["kind", "account", "cents", "target"], defaults=[None])
+
+def to_cents(amount):
+    """把以元为单位的金额转换为整数分，避免浮点误差"""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+class AtomicBankAccount(BankAccount):
+    """加锁的银行账户：余额以整数分保存，每个账户一把锁"""
+    def __init__(self, account_number, initial_balance=0):
+        self._lock = threading.Lock()
+        super().__init__(account_number, initial_balance)  # 经由下面的属性写入 _cents
+
+    # 基类的私有余额 __balance 映射到 _cents，继承来的代码读写的是同一份余额
+    @property
+    def _BankAccount__balance(self):
+        return Decimal(self._cents) / 100
+
+    @_BankAccount__balance.setter
+    def _BankAccount__balance(self, amount):
+        self._cents = to_cents(amount)
+
+    @property
+    def balance_cents(self):
+        return self._cents
+
+    def get_balance(self):
+        return Decimal(self._cents) / 100
+
+    # 调用方必须已持有 self._lock
+    def _deposit_locked(self, cents):
+        if cents <= 0:
+            return TxStatus.INVALID_AMOUNT
+        self._cents += cents
+        return TxStatus.OK
+
+    def _withdraw_locked(self, cents):
+        if cents <= 0:
+            return TxStatus.INVALID_AMOUNT
+        if cents > self._cents:
+            return TxStatus.INSUFFICIENT_FUNDS
+        self._cents -= cents
+        return TxStatus.OK
+
+    def deposit_cents(self, cents):
+        with self._lock:
+            return self._deposit_locked(cents)
+
+    def withdraw_cents(self, cents):
+        with self._lock:
+            return self._withdraw_locked(cents)
+
+    def deposit(self, amount):
+        """兼容 BankAccount 的字符串接口"""
+        if self.deposit_cents(to_cents(amount)) == TxStatus.OK:
+            return f"存款{amount}元成功，余额：{self.get_balance()}元"
+        return "存款金额必须大于0"
+
+    def withdraw(self, amount):
+        if self.withdraw_cents(to_cents(amount)) == TxStatus.OK:
+            return f"取款{amount}元成功，余额：{self.get_balance()}元"
+        return "取款失败：金额不足或无效"
+
+def transfer(source, target, cents):
+    """原子转账：按账号顺序加锁（账号相同时再按对象id），两个方向同时转账也不会死锁"""
+    if source is target:
+        return TxStatus.SAME_ACCOUNT
+    if cents <= 0:
+        return TxStatus.INVALID_AMOUNT
+    first, second = sorted((source, target), key=lambda account: (account.account_number, id(account)))
+    with first._lock, second._lock:
+        status = source._withdraw_locked(cents)
+        if status == TxStatus.OK:
+            target._deposit_locked(cents)
+        return status
+
+def apply_transactions(transactions):
+    """批量执行交易，返回与输入顺序一致的结果码数组 array('b')
+
+    相邻的存取款按账户分组，每个账户只加一次锁就执行完该组的全部操作；
+    转账会同时影响两个账户，因此作为分段点按原顺序逐笔执行，保证结果与逐笔执行一致。
+    """
+    results = array("b", bytes(len(transactions)))
+    pending = defaultdict(list)  # 账户 -> [(序号, 交易)]
+
+    def flush():
+        for account, items in pending.items():
+            with account._lock:
+                for index, tx in items:
+                    if tx.kind == TxKind.DEPOSIT:
+                        results[index] = account._deposit_locked(tx.cents)
+                    else:
+                        results[index] = account._withdraw_locked(tx.cents)
+        pending.clear()
+
+    for index, tx in enumerate(transactions):
+        if tx.kind == TxKind.TRANSFER:
+            flush()
+            results[index] = transfer(tx.account, tx.target, tx.cents)
+        else:
+            pending[tx.account].append((index, tx))
+    flush()
+    return results
+
+def benchmark_transactions(account_count=100, transaction_count=200000, workers=8, batch_size=1000):
+    """线程池并发批量执行随机交易，检查总金额守恒并与逐笔调用 BankAccount 对比"""
+    rng = random.Random(42)
+    accounts = [AtomicBankAccount(f"A{i:05d}", 1000) for i in range(account_count)]
+    kinds = [TxKind.DEPOSIT, TxKind.WITHDRAW, TxKind.TRANSFER]
+    transactions = [
+        Transaction(kind, rng.choice(accounts), rng.randint(1, 50000),
+                    rng.choice(accounts) if kind == TxKind.TRANSFER else None)
+        for kind in (rng.choice(kinds) for _ in range(transaction_count))
+    ]
+    expected_total = sum(a.balance_cents for a in accounts) + sum(
+        tx.cents for tx in transactions if tx.kind == TxKind.DEPOSIT)
+    batches = [transactions[i:i + batch_size] for i in range(0, transaction_count, batch_size)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        all_results = list(pool.map(apply_transactions, batches))
+    elapsed = time.perf_counter() - start
+    withdrawn = sum(tx.cents for batch, results in zip(batches, all_results)
+                    for tx, status in zip(batch, results)
+                    if tx.kind == TxKind.WITHDRAW and status == TxStatus.OK)
+    conserved = sum(a.balance_cents for a in accounts) == expected_total - withdrawn
+
+    plain = {f"A{i:05d}": BankAccount(f"A{i:05d}", 1000) for i in range(account_count)}
+    start = time.perf_counter()
+    for tx in transactions:
+        account = plain[tx.account.account_number]
+        if tx.kind == TxKind.DEPOSIT:
+            account.deposit(tx.cents / 100)
+        elif tx.kind == TxKind.WITHDRAW:
+            account.withdraw(tx.cents / 100)
+        elif "成功" in account.withdraw(tx.cents / 100):
+            plain[tx.target.account_number].deposit(tx.cents / 100)
+    plain_elapsed = time.perf_counter() - start
+
+    print(f"批量引擎({workers}线程): {transaction_count / elapsed:,.0f} 笔/秒, 金额守恒: {conserved}")
+    print(f"逐笔调用BankAccount(单线程): {transaction_count / plain_elapsed:,.0f} 笔/秒")
+    return conserved
+
+# 9. 预写日志与快照
+# 日志文件只追加固定32字节的记录（序号、账号、以分为单位的金额变化），
+# 多个线程的 fsync 合并成一次（group commit）；快照记录余额以及它覆盖到的日志偏移，
+# 恢复时只需重放快照之后的日志尾部，读取时用 mmap 避免把整个文件读进内存。
+JOURNAL_MAGIC = b"BKJNL001"
+SNAPSHOT_MAGIC = b"BKSNP001"
+JOURNAL_RECORD = struct.Struct("<Q16sq")   # 序号, 账号(最多16字节), 金额变化(分)
+SNAPSHOT_HEADER = struct.Struct("<8sQQ")   # 魔数, 覆盖到的日志偏移, 账户数
+SNAPSHOT_ENTRY = struct.Struct("<16sq")    # 账号, 余额(分)
+
+def _encode_account(account_number):
+    key = account_number.encode("utf-8")
+    if len(key) > 16:
+        raise ValueError(f"账号过长（最多16字节）: {account_number}")
+    return key
+
+def _read_snapshot(path):
+    """读取快照，返回 ({账号bytes: 余额}, 日志偏移)；快照不存在时从日志开头重放"""
+    if not os.path.exists(path):
+        return {}, len(JOURNAL_MAGIC)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        magic, offset, count = SNAPSHOT_HEADER.unpack_from(mm, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"不是有效的快照文件: {path}")
+        end = SNAPSHOT_HEADER.size + count * SNAPSHOT_ENTRY.size
+        balances = dict(SNAPSHOT_ENTRY.iter_unpack(memoryview(mm)[SNAPSHOT_HEADER.size:end]))
+    return balances, offset
+
+def _replay_journal(path, balances, offset):
+    """从 offset 开始把日志中的金额变化累加到 balances，返回处理到的文件偏移
+
+    末尾不完整的记录（写入时崩溃）会被忽略。
+    """
+    if not os.path.exists(path) or os.path.getsize(path) <= offset:
+        return max(offset, len(JOURNAL_MAGIC))
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC:
+            raise ValueError(f"不是有效的日志文件: {path}")
+        usable = (len(mm) - offset) // JOURNAL_RECORD.size * JOURNAL_RECORD.size
+        view = memoryview(mm)[offset:offset + usable]
+        get = balances.get
+        for _, key, delta in JOURNAL_RECORD.iter_unpack(view):
+            balances[key] = get(key, 0) + delta
+        view.release()
+    return offset + usable
+
+def recover_balances(directory):
+    """从快照和日志尾部重建全部账户余额，返回 {账号: 余额(分)}"""
+    balances, offset = _read_snapshot(os.path.join(directory, "snapshot.bin"))
+    _replay_journal(os.path.join(directory, "journal.bin"), balances, offset)
+    return {key.rstrip(b"\0").decode("utf-8"): cents for key, cents in balances.items()}
+
+class JournalFailedError(Exception):
+    """日志写入或 fsync 失败后，日志进入失败状态，拒绝再追加或同步"""
+    pass
+
+class TransactionJournal:
+    """只追加的二进制交易日志，支持 group commit 和基于日志的快照
+
+    write 或 fsync 失败时日志文件被截回最后一次成功落盘的位置并进入失败状态，
+    之后的 append 和 sync 都抛出 JournalFailedError，不会把丢失的记录误报为已落盘。
+    """
+    def __init__(self, directory, snapshot_interval=100000):
+        os.makedirs(directory, exist_ok=True)
+        self.journal_path = os.path.join(directory, "journal.bin")
+        self.snapshot_path = os.path.join(directory, "snapshot.bin")
+        self.snapshot_interval = snapshot_interval
+        self._file = open(self.journal_path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(JOURNAL_MAGIC)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        # 截掉崩溃时可能留下的半条记录，保证新记录按32字节对齐
+        tail = (self._file.tell() - len(JOURNAL_MAGIC)) % JOURNAL_RECORD.size
+        if tail:
+            self._file.truncate(self._file.tell() - tail)
+        self._cond = threading.Condition()
+        self._buffer = bytearray()
+        self._next_seq = (self._file.tell() - len(JOURNAL_MAGIC)) // JOURNAL_RECORD.size + 1
+        self._durable_seq = self._next_seq - 1
+        self._flushing = False
+        self._snapshot_lock = threading.Lock()
+        self._last_snapshot_seq = self._durable_seq
+        self._failed = None  # 导致日志失败的异常
+        self.fsync_count = 0
+
+    def append(self, account_number, delta_cents):
+        """追加一条记录到内存缓冲区，返回序号；需要持久化时再调用 sync(seq)"""
+        key = _encode_account(account_number)
+        with self._cond:
+            if self._failed is not None:
+                raise JournalFailedError("日志已失败，拒绝追加新记录") from self._failed
+            seq = self._next_seq
+            self._next_seq += 1
+            self._buffer += JOURNAL_RECORD.pack(seq, key, delta_cents)
+            return seq
+
+    def sync(self, seq=None):
+        """等待序号不超过 seq 的记录全部落盘
+
+        同一时刻只有一个线程执行 write+fsync，它会把其他线程追加的记录一起写出；
+        其余线程等待，醒来后发现自己的记录已被带上就直接返回。
+        """
+        with self._cond:
+            if seq is None:
+                seq = self._next_seq - 1
+            while self._durable_seq < seq:
+                if self._failed is not None:
+                    raise JournalFailedError("日志已失败，记录未能落盘") from self._failed
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                self._flushing = True
+                data = bytes(self._buffer)
+                self._buffer.clear()
+                upto = self._next_seq - 1
+                error = None
+                self._cond.release()
+                try:
+                    try:
+                        self._file.write(data)
+                        self._file.flush()
+                        os.fsync(self._file.fileno())
+                    except Exception as e:
+                        error = e
+                finally:
+                    self._cond.acquire()
+                    self._flushing = False
+                    self._cond.notify_all()
+                if error is not None:
+                    self._fail(error)
+                    raise JournalFailedError("日志写入失败，记录未能落盘") from error
+                self._durable_seq = upto
+                self.fsync_count += 1
+            need_snapshot = self._durable_seq - self._last_snapshot_seq >= self.snapshot_interval
+        if need_snapshot:
+            self.checkpoint()
+
+    def _fail(self, error):
+        """进入失败状态，并把日志文件截回最后一次成功落盘的位置（调用方持有 _cond）"""
+        self._failed = error
+        self._buffer.clear()
+        try:
+            self._file.close()  # 关闭时可能带出部分缓冲数据，随后一并截掉
+        except Exception:
+            pass
+        try:
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(len(JOURNAL_MAGIC) + self._durable_seq * JOURNAL_RECORD.size)
+        except OSError:
+            pass  # 截断也失败时，重新打开日志会按32字节对齐截掉半条记录
+
+    def checkpoint(self):
+        """把上一个快照加上之后已落盘的日志合并成新快照（写临时文件后原子替换）
+
+        快照完全由日志推导，因此生成时不需要阻塞正在进行的交易。
+        """
+        with self._snapshot_lock:
+            with self._cond:
+                durable_seq = self._durable_seq
+            end = len(JOURNAL_MAGIC) + durable_seq * JOURNAL_RECORD.size
+            balances, offset = _read_snapshot(self.snapshot_path)
+            if offset >= end and os.path.exists(self.snapshot_path):
+                return  # 其他线程已经生成了覆盖到这里的快照
+            balances, _ = self._fold(balances, offset, end)
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, end, len(balances)))
+                f.write(b"".join(SNAPSHOT_ENTRY.pack(key, cents) for key, cents in balances.items()))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            self._last_snapshot_seq = durable_seq
+
+    def _fold(self, balances, offset, end):
+        with open(self.journal_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)[offset:end]
+            get = balances.get
+            for _, key, delta in JOURNAL_RECORD.iter_unpack(view):
+                balances[key] = get(key, 0) + delta
+            view.release()
+        return balances, end
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._failed is None:
+            self.sync()
+        self._file.close()
+
+class JournaledBank:
+    """带预写日志的账户集合：每笔成功的交易先记日志，sync 后才算完成"""
+    def __init__(self, directory, snapshot_interval=100000):
+        self.journal = TransactionJournal(directory, snapshot_interval)
+        self.accounts = {}
+        for account_number, cents in recover_balances(directory).items():
+            account = AtomicBankAccount(account_number)
+            account._cents = cents
+            self.accounts[account_number] = account
+        self._accounts_lock = threading.Lock()
+
+    def account(self, account_number):
+        account = self.accounts.get(account_number)
+        if account is None:
+            with self._accounts_lock:
+                account = self.accounts.setdefault(account_number, AtomicBankAccount(account_number))
+        return account
+
+    def _apply(self, account_number, cents, operation, sign, durable):
+        account = self.account(account_number)
+        with account._lock:
+            status = operation(account, cents)
+            if status != TxStatus.OK:
+                return status
+            # 在账户锁内追加，保证同一账户的日志顺序与执行顺序一致
+            try:
+                seq = self.journal.append(account_number, sign * cents)
+            except JournalFailedError:
+                account._cents -= sign * cents
+                raise
+        if durable:
+            try:
+                self.journal.sync(seq)
+            except JournalFailedError:
+                # 日志已失败且不会再写入，撤销内存中的变化，使余额与可恢复的状态一致
+                with account._lock:
+                    account._cents -= sign * cents
+                raise
+        return status
+
+    def deposit(self, account_number, cents, durable=True):
+        return self._apply(account_number, cents, AtomicBankAccount._deposit_locked, 1, durable)
+
+    def withdraw(self, account_number, cents, durable=True):
+        return self._apply(account_number, cents, AtomicBankAccount._withdraw_locked, -1, durable)
+
+    def close(self):
+        self.journal.close()
+
+def benchmark_journal(account_count=100000, record_count=1000000, workers=8, ops_per_worker=2000):
+    """测量 group commit 的 fsync 合并效果，以及百万级记录的恢复速度"""
+    with tempfile.TemporaryDirectory() as directory:
+        bank = JournaledBank(directory)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for w in range(workers):
+                pool.submit(lambda w=w: [bank.deposit(f"A{(w * ops_per_worker + i) % 1000:07d}", 100)
+                                         for i in range(ops_per_worker)])
+        elapsed = time.perf_counter() - start
+        total_ops = workers * ops_per_worker
+        print(f"持久化存款: {total_ops / elapsed:,.0f} 笔/秒, fsync {bank.journal.fsync_count} 次 "
+              f"(平均每次 {total_ops / max(1, bank.journal.fsync_count):.1f} 笔)")
+        bank.close()
+
+    with tempfile.TemporaryDirectory() as directory:
+        keys = [_encode_account(f"A{i:07d}") for i in range(account_count)]
+        rng = random.Random(7)
+        chunk = bytearray(JOURNAL_MAGIC)
+        for seq in range(1, record_count + 1):
+            chunk += JOURNAL_RECORD.pack(seq, keys[rng.randrange(account_count)], rng.randint(-500, 1000))
+        with open(os.path.join(directory, "journal.bin"), "wb") as f:
+            f.write(chunk)
+
+        start = time.perf_counter()
+        balances = recover_balances(directory)
+        full = time.perf_counter() - start
+        with TransactionJournal(directory) as journal:
+            journal.checkpoint()
+        start = time.perf_counter()
+        recover_balances(directory)
+        from_snapshot = time.perf_counter() - start
+        print(f"{record_count:,}条日志 / {len(balances):,}个账户: 全量重放 {full:.2f}秒, 从快照恢复 {from_snapshot:.2f}秒")
+
+# 10. 批量向量化的余额处理
+def _integer_cents(values):
+    """校验金额都是以分为单位的整数，两种后端都对非整数抛 TypeError 而不是截断
+
+    安装了 numpy 时返回 int64 数组（标量得到0维数组），否则返回列表。
+    """
+    if np is not None:
+        result = np.asarray(values)
+        if result.dtype.kind not in "iu" and result.size:
+            raise TypeError("金额必须是以分为单位的整数")
+        return result.astype(np.int64)
+    try:
+        result = list(values)
+    except TypeError:
+        raise TypeError("金额必须是以分为单位的整数") from None
+    if not all(isinstance(v, numbers.Integral) and not isinstance(v, bool) for v in result):
+        raise TypeError("金额必须是以分为单位的整数")
+    return result
+
+class BankAccountBatch:
+    """把大量账户的余额放在一列整数（分）中，存取款和计息都按整列处理
+
+    安装了 numpy 时使用 int64 数组做向量运算，否则退回到 array('q') 加列表推导式。
+    存取款接受一个标量（对所有账户相同）或与账户一一对应的金额序列，
+    返回每个账户是否成功的布尔标记；余额不足的账户保持不变。
+    """
+    def __init__(self, account_numbers, balances_cents):
+        self.account_numbers = list(account_numbers)
+        balances = _integer_cents(balances_cents)
+        self.balances = balances if np is not None else array("q", balances)
+        if len(self.balances) != len(self.account_numbers):
+            raise ValueError("账号数量与余额数量不一致")
+
+    @classmethod
+    def from_accounts(cls, accounts):
+        return cls([a.account_number for a in accounts], [to_cents(a.get_balance()) for a in accounts])
+
+    def __len__(self):
+        return len(self.account_numbers)
+
+    def _amounts(self, amounts):
+        """把标量或序列规范化为与账户对齐的整数（分）金额，两种后端对非整数金额都抛 TypeError"""
+        if np is not None:
+            try:
+                return np.broadcast_to(_integer_cents(amounts), self.balances.shape)
+            except ValueError:
+                raise ValueError("金额数量与账户数量不一致") from None
+        if isinstance(amounts, numbers.Integral) and not isinstance(amounts, bool):
+            return [int(amounts)] * len(self.balances)
+        values = _integer_cents(amounts)
+        if len(values) == 1:
+            return values * len(self.balances)
+        if len(values) != len(self.balances):
+            raise ValueError("金额数量与账户数量不一致")
+        return values
+
+    def deposit(self, amounts):
+        amounts = self._amounts(amounts)
+        if np is not None:
+            ok = amounts > 0
+            self.balances += np.where(ok, amounts, 0)
+            return ok
+        balances = self.balances
+        ok = [amount > 0 for amount in amounts]
+        self.balances = array("q", [b + a if flag else b for b, a, flag in zip(balances, amounts, ok)])
+        return ok
+
+    def withdraw(self, amounts):
+        amounts = self._amounts(amounts)
+        if np is not None:
+            ok = (amounts > 0) & (amounts <= self.balances)
+            self.balances -= np.where(ok, amounts, 0)
+            return ok
+        balances = self.balances
+        ok = [0 < amount <= b for b, amount in zip(balances, amounts)]
+        self.balances = array("q", [b - a if flag else b for b, a, flag in zip(balances, amounts, ok)])
+        return ok
+
+    def apply_interest(self, rate):
+        """按利率计息，利息四舍五入到分；返回本次发放的利息总额（分）"""
+        if np is not None:
+            interest = np.floor(self.balances * rate + 0.5).astype(np.int64)
+            self.balances += interest
+            return int(interest.sum())
+        interest = [math.floor(b * rate + 0.5) for b in self.balances]
+        self.balances = array("q", [b + i for b, i in zip(self.balances, interest)])
+        return sum(interest)
+
+    def to_accounts(self):
+        return [AtomicBankAccount(number, Decimal(int(cents)) / 100)
+                for number, cents in zip(self.account_numbers, self.balances)]
+
+def benchmark_balance_batch(account_count=200000, rate=0.0001, fee_cents=500):
+    """夜间批处理：计息 + 扣手续费，对比逐个调用 BankAccount 与 BankAccountBatch"""
+    rng = random.Random(1)
+    balances = [rng.randint(0, 100000) for _ in range(account_count)]
+
+    accounts = [BankAccount(f"A{i:07d}", cents / 100) for i, cents in enumerate(balances)]
+    start = time.perf_counter()
+    for account in accounts:
+        account.deposit(round(account.get_balance() * rate, 2))
+        account.withdraw(fee_cents / 100)
+    loop_elapsed = time.perf_counter() - start
+
+    batch = BankAccountBatch([a.account_number for a in accounts], balances)
+    start = time.perf_counter()
+    batch.apply_interest(rate)
+    charged = batch.withdraw(fee_cents)
+    batch_elapsed = time.perf_counter() - start
+
+    backend = "numpy" if np is not None else "array"
+    print(f"{account_count:,}个账户: 逐个调用 {loop_elapsed * 1000:.1f}ms, "
+          f"BankAccountBatch({backend}) {batch_elapsed * 1000:.1f}ms, 扣费成功 {sum(charged):,} 个")
+
+# 11. 分派表：批量多态调用
+def animal_concert_batched(animals, out=None, preserve_order=True, chunk_size=65536):
+    """animal_concert 的批量版本，适合数百万个对象的流
+
+    每个类只解析一次 make_sound 和类名前缀（分派表），输入按 chunk_size 分块处理，
+    每块拼接成一个字符串后一次写入 out（默认 sys.stdout）。
+    preserve_order=False 时块内按类型分组，同类对象连续调用同一个函数，输出也按类型分组。
+    返回处理的对象个数。
+    """
+    out = out or sys.stdout
+    dispatch = {}  # 类 -> (输出前缀, make_sound 函数)
+
+    def resolve(cls):
+        entry = dispatch.get(cls)
+        if entry is None:
+            entry = dispatch[cls] = (f"{cls.__name__}: ", cls.make_sound)
+        return entry
+
+    iterator = iter(animals)
+    total = 0
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return total
+        total += len(chunk)
+        lines = []
+        if preserve_order:
+            for animal in chunk:
+                prefix, make_sound = resolve(animal.__class__)
+                lines.append(f"{prefix}{make_sound(animal)}")
+        else:
+            groups = defaultdict(list)
+            for animal in chunk:
+                groups[animal.__class__].append(animal)
+            for cls, group in groups.items():
+                prefix, make_sound = resolve(cls)
+                lines.extend([f"{prefix}{make_sound(animal)}" for animal in group])
+        lines.append("")
+        out.write("\n".join(lines))
+
+def benchmark_animal_concert(n=300000):
+    """比较 animal_concert 与批量分派在不同动物组合下的耗时（输出写入内存缓冲区）"""
+    rng = random.Random(3)
+    mixes = {
+        "全部是Dog": [Dog() for _ in range(n)],
+        "Dog/Cat/Bird均匀混合": [rng.choice((Dog, Cat, Bird))() for _ in range(n)],
+        "90% Dog": [(Dog if rng.random() < 0.9 else rng.choice((Cat, Bird)))() for _ in range(n)],
+    }
+    for label, animals in mixes.items():
+        buffer = io.StringIO()
+        start = time.perf_counter()
+        with redirect_stdout(buffer):
+            animal_concert(animals)
+        original = time.perf_counter() - start
+
+        timings = []
+        for preserve_order in (True, False):
+            start = time.perf_counter()
+            animal_concert_batched(animals, io.StringIO(), preserve_order=preserve_order)
+            timings.append(time.perf_counter() - start)
+        print(f"{label}: animal_concert {original * 1000:.0f}ms, 批量保序 {timings[0] * 1000:.0f}ms, "
+              f"批量分组 {timings[1] * 1000:.0f}ms")
+
+# 12. 去重的图书目录
+class BookCatalog:
+    """按书名+作者去重的图书目录，支持按作者、书名前缀和页数范围查询
+
+    书名和页数的有序索引采用延迟合并：插入时先放进待合并列表，查询前再并入索引。
+    待合并的书不多时逐个 bisect.insort，插入与查询交替时每次查询不必整体重排；
+    批量导入时追加后整体排序一次，不会因为逐个有序插入而退化成 O(n²)。
+    """
+    insort_threshold = 64  # 待合并的书不超过这个数量时逐个有序插入
+
+    def __init__(self, books=()):
+        self._books = {}                     # (书名, 作者) -> Book
+        self._by_author = defaultdict(list)
+        self._title_index = []               # 有序的 (书名, 作者)
+        self._pages_index = []               # 有序的 (页数, 书名, 作者)
+        self._pending = []                   # 尚未并入索引的 (书名, 作者, 页数)
+        self.add_many(books)
+
+    def __len__(self):
+        return len(self._books)
+
+    def __contains__(self, book):
+        return (book.title, book.author) in self._books
+
+    def __iter__(self):
+        return iter(self._books.values())
+
+    def add(self, book):
+        """插入一本书，已存在相同书名和作者的书时忽略并返回 False"""
+        key = (book.title, book.author)
+        if key in self._books:
+            return False
+        self._books[key] = book
+        self._by_author[book.author].append(book)
+        self._pending.append((book.title, book.author, book.pages))
+        return True
+
+    def add_many(self, books):
+        return sum(self.add(book) for book in books)
+
+    def _ensure_sorted(self):
+        pending = self._pending
+        if not pending:
+            return
+        titles, pages = self._title_index, self._pages_index
+        if len(pending) <= self.insort_threshold:
+            for title, author, page_count in pending:
+                bisect.insort(titles, (title, author))
+                bisect.insort(pages, (page_count, title, author))
+        else:
+            titles.extend((title, author) for title, author, _ in pending)
+            pages.extend((page_count, title, author) for title, author, page_count in pending)
+            titles.sort()  # 已有序的前缀加新追加的部分，Timsort 会按归并处理
+            pages.sort()
+        pending.clear()
+
+    def by_author(self, author):
+        return list(self._by_author.get(author, ()))
+
+    def by_title_prefix(self, prefix, limit=None):
+        self._ensure_sorted()
+        index = self._title_index
+        result = []
+        for i in range(bisect.bisect_left(index, (prefix,)), len(index)):
+            key = index[i]
+            if not key[0].startswith(prefix) or (limit is not None and len(result) >= limit):
+                break
+            result.append(self._books[key])
+        return result
+
+    def by_pages(self, low, high):
+        """返回页数在 [low, high] 之间的书，按页数排序"""
+        self._ensure_sorted()
+        index = self._pages_index
+        start = bisect.bisect_left(index, low, key=itemgetter(0))
+        end = bisect.bisect_right(index, high, key=itemgetter(0))
+        return [self._books[(title, author)] for _, title, author in index[start:end]]
+
+def benchmark_book_catalog(n=1000000, queries=1000):
+    """导入 n 本书（含重复）后测量各类查询的耗时"""
+    rng = random.Random(5)
+    books = [Book(f"书名{rng.randrange(n):07d}", f"作者{rng.randrange(n // 10)}", rng.randint(50, 1500))
+             for _ in range(n)]
+    start = time.perf_counter()
+    catalog = BookCatalog(books)
+    catalog.by_pages(0, 0)  # 触发首次排序
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(queries):
+        catalog.by_title_prefix(f"书名{rng.randrange(1000):03d}", limit=20)
+    prefix = (time.perf_counter() - start) / queries
+    start = time.perf_counter()
+    for _ in range(queries):
+        low = rng.randint(50, 1500)
+        catalog.by_pages(low, low + 1)
+    pages = (time.perf_counter() - start) / queries
+    print(f"{n:,}本书去重后{len(catalog):,}本: 建立索引 {build:.2f}秒, "
+          f"前缀查询 {prefix * 1e6:.0f}µs/次, 页数范围查询 {pages * 1e6:.0f}µs/次")
+
+# 13. 基于 mmap 的图书目录文件
+# 文件布局：文件头 | 定长记录区（按书名、作者的UTF-8字节序排序） | 字符串表（UTF-8，重复的字符串只存一次）
+# 打开文件只建立内存映射，不反序列化；查询直接在映射上二分查找，只在访问时才创建 Book 对象。
+CATALOG_MAGIC = b"BOOKCAT1"
+CATALOG_HEADER = struct.Struct("<8sQQ")    # 魔数, 记录数, 字符串表起始偏移
+CATALOG_RECORD = struct.Struct("<IIIII")   # 书名偏移, 书名长度, 作者偏移, 作者长度, 页数
+
+def write_book_catalog(path, books):
+    """把图书写成二进制目录文件（按书名+作者去重），返回写入的记录数"""
+    unique = {(book.title.encode("utf-8"), book.author.encode("utf-8")): book.pages for book in books}
+    strings = bytearray()
+    string_offsets = {}
+
+    def intern(data):
+        offset = string_offsets.get(data)
+        if offset is None:
+            offset = string_offsets[data] = len(strings)
+            strings.extend(data)
+        return offset
+
+    records = bytearray()
+    for (title, author), pages in sorted(unique.items()):
+        records += CATALOG_RECORD.pack(intern(title), len(title), intern(author), len(author), pages)
+    strings_offset = CATALOG_HEADER.size + len(records)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(CATALOG_HEADER.pack(CATALOG_MAGIC, len(unique), strings_offset))
+        f.write(records)
+        f.write(strings)
+    os.replace(tmp_path, path)
+    return len(unique)
+
+class MappedBookCatalog:
+    """只读的内存映射图书目录，支持下标访问、精确查找和书名前缀查询"""
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count, self._strings = CATALOG_HEADER.unpack_from(self._mm, 0)
+        if magic != CATALOG_MAGIC:
+            self.close()
+            raise ValueError(f"不是有效的图书目录文件: {path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __len__(self):
+        return self._count
+
+    def _record(self, index):
+        return CATALOG_RECORD.unpack_from(self._mm, CATALOG_HEADER.size + index * CATALOG_RECORD.size)
+
+    def _string(self, offset, length):
+        start = self._strings + offset
+        return self._mm[start:start + length]
+
+    def _title_bytes(self, index):
+        title_offset, title_length, _, _, _ = self._record(index)
+        return self._string(title_offset, title_length)
+
+    def __getitem__(self, index):
+        """按下标读取一条记录并创建 Book 对象"""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("记录下标超出范围")
+        title_offset, title_length, author_offset, author_length, pages = self._record(index)
+        return Book(self._string(title_offset, title_length).decode("utf-8"),
+                    self._string(author_offset, author_length).decode("utf-8"), pages)
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def _lower_bound(self, title_bytes):
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            if self._title_bytes(mid) < title_bytes:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def find(self, title, author):
+        """精确查找，找不到时返回 None"""
+        title_bytes, author_bytes = title.encode("utf-8"), author.encode("utf-8")
+        for index in range(self._lower_bound(title_bytes), self._count):
+            title_offset, title_length, author_offset, author_length, _ = self._record(index)
+            if self._string(title_offset, title_length) != title_bytes:
+                return None
+            if self._string(author_offset, author_length) == author_bytes:
+                return self[index]
+        return None
+
+    def by_title_prefix(self, prefix, limit=None):
+        prefix_bytes = prefix.encode("utf-8")
+        result = []
+        index = self._lower_bound(prefix_bytes)
+        while index < self._count and (limit is None or len(result) < limit):
+            if not self._title_bytes(index).startswith(prefix_bytes):
+                break
+            result.append(self[index])
+            index += 1
+        return result
+
+def benchmark_book_catalog_loading(n=500000, queries=1000):
+    """对比 JSON 文件与 mmap 目录文件从打开到可以查询的耗时"""
+    rng = random.Random(8)
+    books = [Book(f"书名{i:07d}", f"作者{rng.randrange(n // 20)}", rng.randint(50, 1500)) for i in range(n)]
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, "books.json")
+        binary_path = os.path.join(directory, "books.bin")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump([[b.title, b.author, b.pages] for b in books], f, ensure_ascii=False)
+        write_book_catalog(binary_path, books)
+        targets = [books[rng.randrange(n)] for _ in range(queries)]
+
+        start = time.perf_counter()
+        with open(json_path, encoding="utf-8") as f:
+            loaded = {(title, author): Book(title, author, pages) for title, author, pages in json.load(f)}
+        json_load = time.perf_counter() - start
+        start = time.perf_counter()
+        for book in targets:
+            loaded[(book.title, book.author)]
+        json_query = (time.perf_counter() - start) / queries
+
+        start = time.perf_counter()
+        catalog = MappedBookCatalog(binary_path)
+        mapped_load = time.perf_counter() - start
+        start = time.perf_counter()
+        for book in targets:
+            catalog.find(book.title, book.author)
+        mapped_query = (time.perf_counter() - start) / queries
+        catalog.close()
+
+        print(f"{n:,}本书: JSON 加载 {json_load * 1000:.0f}ms / 查询 {json_query * 1e6:.1f}µs, "
+              f"mmap 打开 {mapped_load * 1000:.2f}ms / 查询 {mapped_query * 1e6:.1f}µs, "
+              f"文件大小 {os.path.getsize(json_path):,} vs {os.path.getsize(binary_path):,} 字节")
+
+# 14. 享元与对象池
+_animal_flyweights = {}  # 类和类名 -> 共享实例
+_animal_classes = {}     # 类名 -> Animal 子类，查不到时重建
+
+def _find_animal_class(name):
+    cls = _animal_classes.get(name)
+    if cls is None:
+        # 可能有新定义的子类，重新遍历一次继承树
+        _animal_classes.clear()
+        pending = list(Animal.__subclasses__())
+        while pending:
+            sub = pending.pop()
+            _animal_classes.setdefault(sub.__name__, sub)
+            pending.extend(sub.__subclasses__())
+        cls = _animal_classes.get(name)
+        if cls is None:
+            raise KeyError(f"未知的动物类型: {name}")
+    return cls
+
+def get_animal(kind):
+    """返回无状态 Animal 子类的共享实例（享元），kind 可以是类或类名
+
+    只有构造后没有任何实例属性的类才能共享，否则抛出 TypeError。
+    共享实例同时按类和类名缓存，命中时只需一次字典查找。
+    """
+    animal = _animal_flyweights.get(kind)
+    if animal is not None:
+        return animal
+    cls = _find_animal_class(kind) if isinstance(kind, str) else kind
+    animal = _animal_flyweights.get(cls)
+    if animal is None:
+        if not issubclass(cls, Animal):
+            raise TypeError(f"{cls.__name__} 不是 Animal 的子类")
+        candidate = cls()
+        if getattr(candidate, "__dict__", None):
+            raise TypeError(f"{cls.__name__} 的实例带有状态，不能作为享元共享")
+        animal = _animal_flyweights.setdefault(cls, candidate)
+    return _animal_flyweights.setdefault(kind, animal)
+
+class _Lease:
+    """ObjectPool.lease 返回的上下文管理器，退出时把对象归还给池"""
+    __slots__ = ("pool", "obj")
+
+    def __init__(self, pool, obj):
+        self.pool = pool
+        self.obj = obj
+
+    def __enter__(self):
+        return self.obj
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.pool.release(self.obj)
+
+class ObjectPool:
+    """通用对象池：释放的对象放回空闲列表，下次 acquire 时用 reset 钩子重新初始化
+
+    reset(obj, *args, **kwargs) 默认重新调用该对象的 __init__。
+    借出的对象按 id() 记录，重复归还或归还不属于本池的对象会抛出 ValueError。
+    空闲列表的 pop/append 和借出集合的 add/remove 在 CPython 中都是原子操作，
+    同一对象不会被两次借出，因此不加锁；多线程并发归还时空闲列表可能略微超过 max_size，
+    created/reused 计数也只是近似值。
+    CPython 分配小对象本身很快，借还的开销可能高于直接构造（见 benchmark_flyweights_and_pool），
+    只有构造代价高或持有外部资源的对象才值得入池。
+    """
+    def __init__(self, factory, reset=None, max_size=1024):
+        self.factory = factory
+        self.reset = reset
+        self.max_size = max_size
+        self._free = []
+        self._leased = set()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, *args, **kwargs):
+        try:
+            obj = self._free.pop()
+        except IndexError:
+            self.created += 1
+            obj = self.factory(*args, **kwargs)
+        else:
+            self.reused += 1
+            if self.reset is None:
+                obj.__init__(*args, **kwargs)
+            else:
+                self.reset(obj, *args, **kwargs)
+        self._leased.add(id(obj))
+        return obj
+
+    def release(self, obj):
+        try:
+            self._leased.remove(id(obj))  # 只有一个线程能移除成功，重复归还在这里被拦下
+        except KeyError:
+            raise ValueError("对象不是从此池借出的，或已经归还") from None
+        if len(self._free) < self.max_size:
+            self._free.append(obj)
+
+    def lease(self, *args, **kwargs):
+        """with pool.lease(...) as obj: 用完自动归还"""
+        return _Lease(self, self.acquire(*args, **kwargs))
+
+book_pool = ObjectPool(Book)
+person_pool = ObjectPool(Person)
+
+def benchmark_flyweights_and_pool(n=200000):
+    """比较享元查找、对象池借还与直接构造的单次耗时，以及 n 次构造与借还期间的内存分配峰值"""
+    def per_call(fn):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        return (time.perf_counter() - start) / n * 1e9
+
+    def lease_book():
+        with pool.lease("临时书", "佚名", 100):
+            pass
+
+    def peak(fn):
+        tracemalloc.start()
+        for _ in range(n):
+            fn()
+        used = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return used
+
+    pool = ObjectPool(Book)
+    results = {
+        'get_animal("Bird")': per_call(lambda: get_animal("Bird")),
+        "get_animal(Dog)": per_call(lambda: get_animal(Dog)),
+        "Dog()": per_call(Dog),
+        "Book(...)": per_call(lambda: Book("临时书", "佚名", 100)),
+        "pool.acquire+release": per_call(lambda: pool.release(pool.acquire("临时书", "佚名", 100))),
+        "with pool.lease(...)": per_call(lease_book),
+    }
+    for label, ns in results.items():
+        print(f"{label}: {ns:.0f} ns/次")
+    print(f"内存分配峰值: 直接构造 {peak(lambda: Book('临时书', '佚名', 100)):,} 字节, "
+          f"对象池 {peak(lease_book):,} 字节")
+    return results
+
+# 15. 流式批量更新年龄
+def age_on(birth_date, as_of):
+    """计算 as_of 当天的周岁；2月29日出生的人在平年的3月1日长一岁"""
+    return as_of.year - birth_date.year - ((as_of.month, as_of.day) < (birth_date.month, birth_date.day))
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def stream_age_updates(records, as_of, chunk_size=10000):
+    """按块处理 (person, 出生日期) 记录，把年龄更新为 as_of 当天的周岁
+
+    这是一个生成器，每处理完一块就产出该块中年龄发生变化的人数；不打印任何内容。
+    """
+    for chunk in _chunked(records, chunk_size):
+        changed = 0
+        for person, birth_date in chunk:
+            age = age_on(birth_date, as_of)
+            if person.age != age:
+                person.age = age
+                changed += 1
+        yield changed
+
+def stream_column_age_updates(ages, birth_dates, as_of, chunk_size=10000):
+    """列式版本：原地更新 ages 数组（如 EmployeeTable.ages），每块产出变化的人数"""
+    for start in range(0, len(ages), chunk_size):
+        changed = 0
+        for i in range(start, min(start + chunk_size, len(ages))):
+            age = age_on(birth_dates[i], as_of)
+            if ages[i] != age:
+                ages[i] = age
+                changed += 1
+        yield changed
+
+class BirthdayIndex:
+    """按（月, 日）索引出生日期，增量更新时只访问生日落在日期窗口内的人
+
+    entries 为 (item, 出生日期)，item 可以是 Person 对象，也可以是列式表中的行号。
+    """
+    def __init__(self, entries=()):
+        self._by_day = defaultdict(list)
+        for item, birth_date in entries:
+            self.add(item, birth_date)
+
+    def add(self, item, birth_date):
+        self._by_day[(birth_date.month, birth_date.day)].append((item, birth_date))
+
+    def due(self, start, end):
+        """产出生日（含平年中顺延到3月1日的2月29日）落在 [start, end] 内的条目，每个条目最多一次"""
+        if (end - start).days >= 365:
+            # 连续366天必然覆盖所有（月, 日），直接产出全部条目
+            for entries in self._by_day.values():
+                yield from entries
+            return
+        by_day, seen = self._by_day, set()
+        day = start
+        while day <= end:
+            keys = [(day.month, day.day)]
+            if day.month == 3 and day.day == 1 and not isleap(day.year):
+                keys.append((2, 29))
+            for key in keys:
+                if key not in seen:
+                    seen.add(key)  # 跨年窗口里同一个（月, 日）可能出现两次
+                    yield from by_day.get(key, ())
+            day += timedelta(days=1)
+
+    def update_window(self, start, end, set_age):
+        """把窗口内过生日的人的年龄更新为 end 当天的周岁，返回更新人数
+
+        年龄按出生日期直接计算而不是加一，所以对同一窗口重复运行结果不变。
+        """
+        count = 0
+        for item, birth_date in self.due(start, end):
+            set_age(item, age_on(birth_date, end))
+            count += 1
+        return count
+
+def set_person_age(person, age):
+    person.age = age
 
 # 练习题
 if __name__ == "__main__":
@@ -144,4 +1479,81 @@ if __name__ == "__main__":
     book2 = Book("Python编程", "张作者", 300)
     print(f"书籍信息: {book1}")
     print(f"书籍页数: {len(book1)}")
-    print(f"两本书相同吗: {book1 == book2}")
\ No newline at end of file
+    print(f"两本书相同吗: {book1 == book2}")
+    
+    # 练习6：紧凑存储
+    table = EmployeeTable()
+    row = table.append("王五", 30, "E0001", "技术部")
+    row.add_project("支付系统")
+    print(row.get_work_info(), row.projects)
+    compact_dev = CompactDeveloper("赵六", 26, "DEV002", "技术部", ["Go"])
+    print(compact_dev.write_code("Go"))
+    benchmark_employee_memory()
+    
+    # 练习7：带索引的员工登记表
+    registry = EmployeeRegistry([dev, compact_dev, Employee("钱七", 35, "E0002", "市场部")])
+    registry.add_project("DEV001", "数据平台")
+    print([e.name for e in registry.find(department="技术部", language="Python")])
+    print([e.name for e in registry.find(project="数据平台")])
+    
+    # 练习8：交易引擎
+    a = AtomicBankAccount("A001", 100)
+    b = AtomicBankAccount("A002", 50)
+    print(transfer(a, b, to_cents(30)).name, a.get_balance(), b.get_balance())
+    print(list(apply_transactions([
+        Transaction(TxKind.DEPOSIT, a, 500),
+        Transaction(TxKind.WITHDRAW, b, 10**9),
+        Transaction(TxKind.TRANSFER, b, 1000, a),
+    ])))
+    benchmark_transactions()
+    
+    # 练习9：预写日志与快照
+    with tempfile.TemporaryDirectory() as journal_dir:
+        bank = JournaledBank(journal_dir, snapshot_interval=2)
+        bank.deposit("A001", 10000)
+        bank.withdraw("A001", 2500)
+        bank.deposit("A002", 300)
+        bank.close()
+        print(f"恢复后的余额(分): {recover_balances(journal_dir)}")
+    benchmark_journal(account_count=10000, record_count=200000)
+    
+    # 练习10：批量向量化的余额处理
+    batch = BankAccountBatch(["A001", "A002", "A003"], [10000, 300, 0])
+    print(f"取款结果: {list(map(bool, batch.withdraw(500)))}, 余额: {list(map(int, batch.balances))}")
+    print(f"发放利息: {batch.apply_interest(0.01)}分, 余额: {list(map(int, batch.balances))}")
+    benchmark_balance_batch()
+    
+    # 练习11：分派表批量调用
+    animal_concert_batched(animals + [Dog()], preserve_order=False)
+    benchmark_animal_concert()
+    
+    # 练习12：可哈希的 Book 与去重目录
+    print(f"集合去重后: {len({book1, book2})} 本")
+    catalog = BookCatalog([book1, book2, Book("Python进阶", "李作者", 450), Book("Java入门", "张作者", 280)])
+    print(catalog.by_title_prefix("Python"), catalog.by_author("张作者"), catalog.by_pages(250, 320))
+    benchmark_book_catalog(n=200000)
+    
+    # 练习13：mmap 图书目录文件
+    with tempfile.TemporaryDirectory() as catalog_dir:
+        catalog_path = os.path.join(catalog_dir, "books.bin")
+        write_book_catalog(catalog_path, catalog)
+        with MappedBookCatalog(catalog_path) as mapped:
+            print(len(mapped), mapped.find("Java入门", "张作者"), mapped.by_title_prefix("Python"))
+    benchmark_book_catalog_loading(n=200000)
+    
+    # 练习14：享元与对象池
+    print(f"共享的Dog实例: {get_animal('Dog') is get_animal(Dog)}")
+    animal_concert([get_animal(kind) for kind in ("Dog", "Cat", "Bird")])
+    for i in range(1000):
+        with book_pool.lease(f"临时书{i}", "佚名", 100) as temp_book:
+            len(temp_book)
+    print(f"Book对象池: 新建 {book_pool.created} 个, 复用 {book_pool.reused} 次")
+    benchmark_flyweights_and_pool()
+    
+    # 练习15：流式批量更新年龄
+    population = [(Person(f"居民{i}", 0), date(1990 + i % 30, 1 + i % 12, 1 + i % 28)) for i in range(50000)]
+    changed = sum(stream_age_updates(population, date(2024, 6, 30)))
+    print(f"全量更新: {changed} 人的年龄发生变化")
+    birthday_index = BirthdayIndex(population)
+    updated = birthday_index.update_window(date(2024, 7, 1), date(2024, 7, 7), set_person_age)
+    print(f"增量更新7月第一周: {updated} 人, {population[6][0].introduce()}")